@@ -1,11 +1,629 @@
 import re
+import io
+import csv
+import sys
+import copy
 import json
+import math
+import time
+import struct
+import base64
+import hashlib
+import heapq
+import fnmatch
+import itertools
+import threading
+from array import array
+from contextlib import contextmanager
+from bisect import bisect_right
+
+#Largest weight a decayed document can have before the counters are rescaled
+DECAY_REBASE_LIMIT = 2.0 ** 512
+
+#Source of snapshot epochs, every epoch is only used by one data guide
+_EPOCHS = itertools.count(1)
+
+#Source of stamps for deleted documents, negative so they never match the id of an inserted document
+_DELETE_STAMPS = itertools.count(-2, -1)
+
+#Bytes of a pointer, the size of each attribute slot of an object
+_POINTER_SIZE = struct.calcsize("P")
 
 #Basic function to return dictionary of counters based on common types
 def counters():
     return {"int": 0, "str": 0, "float": 0, "date":0, "obj": 0, "arr": 0}
 
+class ValueStats:
+    #Attributes measured by memory_usage
+    _fields = ("num_count", "num_min", "num_max", "num_sum", "str_count", "str_min", "str_max", "arr_min", "arr_max",
+               "arr_lengths")
+
+    def __init__(self):
+        """
+        Initialization method for ValueStats
+        -- Fixed size summary of the values stored at a path, can be merged with summaries from other guides
+        """
+        #Count, minimum, maximum and sum of numeric values
+        self.num_count = 0
+        self.num_min = None
+        self.num_max = None
+        self.num_sum = 0
+        #Count, minimum length and maximum length of string values
+        self.str_count = 0
+        self.str_min = None
+        self.str_max = None
+        #Minimum and maximum array length
+        self.arr_min = None
+        self.arr_max = None
+        #Array length distribution, index i counts arrays whose length has bit length i (0, 1, 2-3, 4-7, ...)
+        self.arr_lengths = []
+
+    def add(self, type_name, value):
+        """
+        Method to add a single value of type type_name to the summary
+        """
+        #Numeric values
+        if type_name == "int" or type_name == "float":
+            self.num_count += 1
+            self.num_sum += value
+            if self.num_min is None or value < self.num_min:
+                self.num_min = value
+            if self.num_max is None or value > self.num_max:
+                self.num_max = value
+        #String values (dates are strings)
+        elif type_name == "str" or type_name == "date":
+            length = len(value)
+            self.str_count += 1
+            if self.str_min is None or length < self.str_min:
+                self.str_min = length
+            if self.str_max is None or length > self.str_max:
+                self.str_max = length
+        #Array values
+        elif type_name == "arr":
+            length = len(value)
+            if self.arr_min is None or length < self.arr_min:
+                self.arr_min = length
+            if self.arr_max is None or length > self.arr_max:
+                self.arr_max = length
+            #Get distribution bucket of length
+            bucket = length.bit_length()
+            #Add buckets if length is longer than any seen before
+            if bucket >= len(self.arr_lengths):
+                self.arr_lengths.extend([0] * (bucket + 1 - len(self.arr_lengths)))
+            self.arr_lengths[bucket] += 1
+
+    def merge(self, other):
+        """
+        Method to return a new summary combining this summary with other
+        """
+        #Create new summary to store merge
+        merged = ValueStats()
+        #Combine numeric summaries
+        merged.num_count = self.num_count + other.num_count
+        merged.num_sum = self.num_sum + other.num_sum
+        merged.num_min = _merge_bound(min, self.num_min, other.num_min)
+        merged.num_max = _merge_bound(max, self.num_max, other.num_max)
+        #Combine string summaries
+        merged.str_count = self.str_count + other.str_count
+        merged.str_min = _merge_bound(min, self.str_min, other.str_min)
+        merged.str_max = _merge_bound(max, self.str_max, other.str_max)
+        #Combine array summaries
+        merged.arr_min = _merge_bound(min, self.arr_min, other.arr_min)
+        merged.arr_max = _merge_bound(max, self.arr_max, other.arr_max)
+        #Add distribution buckets together, padding the shorter distribution with zeros
+        size = max(len(self.arr_lengths), len(other.arr_lengths))
+        merged.arr_lengths = [a + b for a, b in zip(self.arr_lengths + [0] * (size - len(self.arr_lengths)),
+                                                    other.arr_lengths + [0] * (size - len(other.arr_lengths)))]
+        return merged
+
+    def summary(self):
+        """
+        Method to return the summary as a dictionary, including the mean of numeric values
+        """
+        #Get stored values
+        d = self.to_dict()
+        #Add mean if numeric values were stored
+        d["num_mean"] = self.num_sum / self.num_count if self.num_count else None
+        return d
+
+    def to_dict(self):
+        """
+        Method to convert summary to dictionary for output
+        """
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Class method to convert summary dictionary from data guide text file to summary
+        """
+        #Create new summary
+        stats = cls()
+        #Copy stored values, ignoring unknown keys
+        for key, value in d.items():
+            if key in stats.__dict__:
+                setattr(stats, key, value)
+        return stats
+
+#JSON Schema type of each counter type, types not listed are left out of schemas
+SCHEMA_TYPES = {"int": "integer", "float": "number", "str": "string", "date": "string", "obj": "object",
+                "arr": "array", "bool": "boolean", "NoneType": "null"}
+
+#Basic function to check if a key matches one segment of a projection pattern (wildcards as in fnmatch)
+def _segment_matches(key, segment):
+    return key == segment or (any(c in segment for c in "*?[") and fnmatch.fnmatchcase(key, segment))
+
+#Basic function to combine two optional bounds with min or max
+def _merge_bound(func, a, b):
+    #Return other bound if one is missing
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return func(a, b)
+
+#Basic function writing rows to an open file handle in large chunks, format_rows turns a list of rows into text
+def _write_rows(fp, rows, format_rows, chunk=10000):
+    #Rows waiting to be written
+    batch = []
+    for row in rows:
+        batch.append(row)
+        #Format and write rows in large chunks
+        if len(batch) >= chunk:
+            fp.write(format_rows(batch))
+            batch.clear()
+    #Write remaining rows
+    if batch:
+        fp.write(format_rows(batch))
+
+#Basic function returning the bytes of a value held by a node, small integers, None and booleans are shared and cost nothing
+def _value_size(value):
+    if value is None or isinstance(value, bool) or (isinstance(value, int) and -5 <= value <= 256):
+        return 0
+    return sys.getsizeof(value)
+
+#Basic function returning the bytes of a sketch and everything its fields hold, walked with a stack
+#Fields are read one by one from the _fields of its class, reading __dict__ would build an instance dictionary and
+#count attribute names shared by every sketch
+def _deep_sizeof(obj):
+    #Sketch object, attribute values are stored inline as one pointer each after a two pointer header
+    size = sys.getsizeof(obj) + _POINTER_SIZE * (len(obj._fields) + 2)
+    seen = set()
+    stack = [getattr(obj, name) for name in obj._fields]
+    while stack:
+        value = stack.pop()
+        #Count shared objects once
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += _value_size(value)
+        if isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            stack.extend(value)
+    return size
+
+class HyperLogLog:
+    #Attributes measured by memory_usage
+    _fields = ("precision", "registers")
+
+    def __init__(self, precision=12):
+        """
+        Initialization method for HyperLogLog
+        -- Estimates the number of distinct values added using 2**precision one byte registers
+        """
+        #Number of hash bits used to pick a register
+        self.precision = precision
+        #Registers storing the longest run of leading zeros seen
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        """
+        Method to add a value to the sketch
+        """
+        #64 bit hash of value, repr keeps values of different types apart (1 and "1")
+        h = int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "big")
+        #First bits of hash pick the register
+        index = h >> (64 - self.precision)
+        #Remaining bits give the rank (position of first one bit)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        #Keep the highest rank seen by register
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        """
+        Method to return the estimated number of distinct values added
+        """
+        #Number of registers
+        m = len(self.registers)
+        #Bias correction constant
+        alpha = 0.7213 / (1 + 1.079 / m)
+        #Raw harmonic mean estimate
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        #Use linear counting for small cardinalities
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        """
+        Method to return a new sketch counting the distinct values of both sketches
+        """
+        #Registers of different sizes cannot be combined
+        if self.precision != other.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precisions")
+        #Create new sketch to store merge
+        merged = HyperLogLog(self.precision)
+        #Keep highest rank of each register
+        merged.registers = bytearray(map(max, self.registers, other.registers))
+        return merged
+
+    def to_dict(self):
+        """
+        Method to convert sketch to dictionary for output
+        """
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Class method to convert sketch dictionary from data guide text file to sketch
+        """
+        #Create new sketch
+        sketch = cls(d["precision"])
+        #Decode stored registers
+        sketch.registers = bytearray(base64.b64decode(d["registers"]))
+        return sketch
+
+class SpaceSaving:
+    #Attributes measured by memory_usage
+    _fields = ("capacity", "counts", "errors")
+
+    def __init__(self, capacity=32):
+        """
+        Initialization method for SpaceSaving
+        -- Tracks the most frequent values with at most capacity counters (space-saving algorithm)
+        """
+        #Maximum number of values tracked
+        self.capacity = capacity
+        #Count of each tracked value, an overestimate by at most the value's error
+        self.counts = {}
+        #Maximum overcount of each tracked value
+        self.errors = {}
+
+    def add(self, value, grow=True):
+        """
+        Method to add a value to the sketch, returns True if a new counter was used
+        -- If grow is False or the sketch is full, the least frequent value is replaced instead
+        """
+        #Value already tracked
+        if value in self.counts:
+            self.counts[value] += 1
+            return False
+        #Room for a new counter
+        if grow and len(self.counts) < self.capacity:
+            self.counts[value] = 1
+            self.errors[value] = 0
+            return True
+        #Nothing tracked and no room to grow, value is dropped
+        if not self.counts:
+            return False
+        #Replace least frequent value, new value inherits its count as error
+        victim = min(self.counts, key=self.counts.get)
+        count = self.counts.pop(victim)
+        del self.errors[victim]
+        self.counts[value] = count + 1
+        self.errors[value] = count
+        return False
+
+    def top(self, n=None):
+        """
+        Method to return up to n (value, count, error) tuples, most frequent first
+        """
+        #Sort tracked values by count
+        ranked = sorted(self.counts, key=self.counts.get, reverse=True)
+        return [(value, self.counts[value], self.errors[value]) for value in ranked[:n]]
+
+    def merge(self, other):
+        """
+        Method to return a new sketch combining this sketch with other
+        -- Values missing from a full sketch may have occurred up to its smallest count, so that count is added
+        """
+        #Smallest count of each sketch if full, zero if values were never dropped
+        floor1 = min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+        floor2 = min(other.counts.values()) if len(other.counts) >= other.capacity else 0
+        #Create new sketch to store merge
+        merged = SpaceSaving(self.capacity)
+        #Iterate over values in either sketch
+        for value in {**self.counts, **other.counts}:
+            #Add counts and errors, using each sketch's floor for values it does not track
+            merged.counts[value] = self.counts.get(value, floor1) + other.counts.get(value, floor2)
+            merged.errors[value] = self.errors.get(value, floor1) + other.errors.get(value, floor2)
+        #Keep only the most frequent values
+        for value in sorted(merged.counts, key=merged.counts.get)[:max(0, len(merged.counts) - merged.capacity)]:
+            del merged.counts[value]
+            del merged.errors[value]
+        return merged
+
+    def to_dict(self):
+        """
+        Method to convert sketch to dictionary for output
+        """
+        return {"capacity": self.capacity, "items": [list(item) for item in self.top()]}
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Class method to convert sketch dictionary from data guide text file to sketch
+        """
+        #Create new sketch
+        sketch = cls(d["capacity"])
+        #Add stored values
+        for value, count, error in d["items"]:
+            sketch.counts[value] = count
+            sketch.errors[value] = error
+        return sketch
+
+class DocBitmap:
+    #Attributes measured by memory_usage
+    _fields = ("starts", "ends", "size")
+
+    def __init__(self):
+        """
+        Initialization method for DocBitmap
+        -- Compressed set of document ids stored as runs of consecutive ids
+        """
+        #First id of each run
+        self.starts = array("I")
+        #Id after the last id of each run
+        self.ends = array("I")
+        #Number of ids stored
+        self.size = 0
+
+    def add(self, doc_id):
+        """
+        Method to add a document id, ids added in increasing order only extend or append a run
+        """
+        #Id after every stored id, start a new run
+        if not self.ends or self.ends[-1] < doc_id:
+            self.starts.append(doc_id)
+            self.ends.append(doc_id + 1)
+        #Id right after the last run, extend it
+        elif self.ends[-1] == doc_id:
+            self.ends[-1] = doc_id + 1
+        #Id already stored
+        elif doc_id in self:
+            return
+        #Id out of order, merge it into the runs
+        else:
+            merged = self | DocBitmap.from_runs([(doc_id, doc_id + 1)])
+            self.starts, self.ends = merged.starts, merged.ends
+        self.size += 1
+
+    def discard(self, doc_id):
+        """
+        Method to remove a document id if present, used to delete a single document by id
+        -- Removing an id shortens or splits its run in place, batches of ids are removed with - instead
+        """
+        #Get run that could hold id
+        i = bisect_right(self.starts, doc_id) - 1
+        #Return if id is not stored
+        if i < 0 or doc_id >= self.ends[i]:
+            return
+        start, end = self.starts[i], self.ends[i]
+        #Run only holds id, remove run
+        if end - start == 1:
+            del self.starts[i]
+            del self.ends[i]
+        #Id at start of run
+        elif doc_id == start:
+            self.starts[i] = doc_id + 1
+        #Id at end of run
+        elif doc_id == end - 1:
+            self.ends[i] = doc_id
+        #Id inside run, split run in two
+        else:
+            self.ends[i] = doc_id
+            self.starts.insert(i + 1, doc_id + 1)
+            self.ends.insert(i + 1, end)
+        self.size -= 1
+
+    def __contains__(self, doc_id):
+        """
+        Method to check if a document id is stored
+        """
+        #Get run that could hold id
+        i = bisect_right(self.starts, doc_id) - 1
+        return i >= 0 and doc_id < self.ends[i]
+
+    def __len__(self):
+        """
+        Method to return the number of document ids stored
+        """
+        return self.size
+
+    def __iter__(self):
+        """
+        Method to iterate over stored document ids in increasing order
+        """
+        for start, end in zip(self.starts, self.ends):
+            yield from range(start, end)
+
+    def runs(self):
+        """
+        Method to return an iterator of (start, end) runs, end is exclusive
+        """
+        return zip(self.starts, self.ends)
+
+    @classmethod
+    def from_runs(cls, runs):
+        """
+        Class method to create a bitmap from sorted, non-overlapping (start, end) runs
+        """
+        #Create new bitmap
+        bitmap = cls()
+        #Iterate over runs
+        for start, end in runs:
+            #Join run to previous run if they touch
+            if bitmap.ends and start <= bitmap.ends[-1]:
+                bitmap.ends[-1] = max(bitmap.ends[-1], end)
+            else:
+                bitmap.starts.append(start)
+                bitmap.ends.append(end)
+        #Count stored ids
+        bitmap.size = sum(bitmap.ends) - sum(bitmap.starts)
+        return bitmap
+
+    def __or__(self, other):
+        """
+        Method to return the union of two bitmaps
+        """
+        #Merge sorted runs of both bitmaps, from_runs joins overlapping runs
+        return DocBitmap.from_runs(heapq.merge(self.runs(), other.runs()))
+
+    def __and__(self, other):
+        """
+        Method to return the intersection of two bitmaps
+        """
+        #Store overlapping parts of runs
+        runs = []
+        #Position in runs of each bitmap
+        i = j = 0
+        while i < len(self.starts) and j < len(other.starts):
+            #Overlap of current runs
+            start = max(self.starts[i], other.starts[j])
+            end = min(self.ends[i], other.ends[j])
+            if start < end:
+                runs.append((start, end))
+            #Move past the run that ends first
+            if self.ends[i] < other.ends[j]:
+                i += 1
+            else:
+                j += 1
+        return DocBitmap.from_runs(runs)
+
+    def __sub__(self, other):
+        """
+        Method to return the ids in this bitmap that are not in other
+        """
+        #Store remaining parts of runs
+        runs = []
+        #Position in runs of other bitmap
+        j = 0
+        #Iterate over runs of this bitmap
+        for start, end in self.runs():
+            #Skip runs of other that end before this run
+            while j < len(other.starts) and other.ends[j] <= start:
+                j += 1
+            #Cut out every run of other that overlaps this run
+            k = j
+            while k < len(other.starts) and other.starts[k] < end:
+                if other.starts[k] > start:
+                    runs.append((start, other.starts[k]))
+                start = max(start, other.ends[k])
+                k += 1
+            #Keep what is left of the run
+            if start < end:
+                runs.append((start, end))
+        return DocBitmap.from_runs(runs)
+
+    def shifted(self, offset):
+        """
+        Method to return a copy of the bitmap with offset added to every id
+        """
+        return DocBitmap.from_runs((start + offset, end + offset) for start, end in self.runs())
+
+    def to_dict(self):
+        """
+        Method to convert bitmap to dictionary for output
+        """
+        return {"starts": self.starts.tolist(), "ends": self.ends.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Class method to convert bitmap dictionary from data guide text file to bitmap
+        """
+        return cls.from_runs(zip(d["starts"], d["ends"]))
+
+class _ThreadSeconds(threading.local):
+    #Seconds spent by the current thread, starts at zero in every thread
+    seconds = 0.0
+
+#Seconds each thread spent classifying values for instrumented data guides, so a timed insert or delete can leave
+#out its own classification without counting values classified by other threads meanwhile
+_CLASSIFY_TIME = _ThreadSeconds()
+
+class Instrumentation:
+    def __init__(self):
+        """
+        Initialization method for Instrumentation
+        -- Counts and phase times gathered by a data guide while instrumentation is enabled
+        """
+        #Nodes added, copied for snapshots and removed by deletes
+        self.nodes_created = 0
+        self.nodes_copied = 0
+        self.nodes_pruned = 0
+        #Number of values classified per type, and number of date checks (regular expression matches)
+        self.types = {}
+        self.date_checks = 0
+        #Documents inserted and deleted
+        self.docs_inserted = 0
+        self.docs_deleted = 0
+        #Seconds spent and calls made per phase
+        self.seconds = {"parse": 0.0, "classify": 0.0, "tree_update": 0.0, "delete": 0.0, "serialize": 0.0}
+        self.calls = {phase: 0 for phase in self.seconds}
+
+    def add_time(self, phase, seconds, calls=1):
+        """
+        Method to add seconds spent in a phase
+        """
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + calls
+
+    @contextmanager
+    def timer(self, phase):
+        """
+        Context manager adding the time spent inside it to a phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def to_dict(self):
+        """
+        Method to convert instrumentation to dictionary for output
+        """
+        return {
+            "nodes_created": self.nodes_created,
+            "nodes_copied": self.nodes_copied,
+            "nodes_pruned": self.nodes_pruned,
+            "types": dict(self.types),
+            "date_checks": self.date_checks,
+            "docs_inserted": self.docs_inserted,
+            "docs_deleted": self.docs_deleted,
+            "seconds": dict(self.seconds),
+            "calls": dict(self.calls),
+        }
+
 class Node:
+    #Value statistics of node, only set when data guide tracks value statistics
+    stats = None
+    #Distinct value sketch of node, only set when data guide tracks distinct values
+    hll = None
+    #Frequent value sketch of node, only set when data guide tracks top values
+    top = None
+    #Ids of documents containing node, only set when data guide tracks document ids
+    docs = None
+    #Epoch the node was written in, nodes of older epochs are shared with snapshots and copied before changing
+    epoch = 0
+
     def __init__(self):
         """
         Initialization method for Node
@@ -14,6 +632,10 @@ class Node:
         self.children = {}
         #Add counters dictionary
         self.counters = counters()
+        #Number of documents containing node
+        self.doc_count = 0
+        #Id of last document that reached node, so a document is only counted once
+        self.last_doc = -1
 
     def update_counter(self, type_name, delta=1):
         """
@@ -28,16 +650,53 @@ class Node:
             #set counter equal to delta
             self.counters[type_name] = delta
         
+    def copy(self, epoch):
+        """
+        Method returning a copy of node written in epoch, children are shared and sketches are copied
+        """
+        #Create node without running initialization
+        node = Node.__new__(Node)
+        #Copy dictionaries so changes to the copy do not reach node
+        node.children = self.children.copy()
+        node.counters = self.counters.copy()
+        node.doc_count = self.doc_count
+        node.last_doc = self.last_doc
+        node.epoch = epoch
+        #Copy sketches that are present
+        if self.stats is not None:
+            node.stats = copy.deepcopy(self.stats)
+        if self.hll is not None:
+            node.hll = copy.deepcopy(self.hll)
+        if self.top is not None:
+            node.top = copy.deepcopy(self.top)
+        if self.docs is not None:
+            node.docs = copy.deepcopy(self.docs)
+        return node
+
     def to_dict(self):
         """
         Method to convert node to dictionary for output
         """
         #Create children dictionary and fill with values
         children_dict = {key: child.to_dict() for key, child in self.children.items()}
-        return {
+        d = {
             "counters": self.counters,
+            "doc_count": self.doc_count,
             "children": children_dict
         }
+        #Add value statistics if present
+        if self.stats is not None:
+            d["stats"] = self.stats.to_dict()
+        #Add distinct value sketch if present
+        if self.hll is not None:
+            d["hll"] = self.hll.to_dict()
+        #Add frequent value sketch if present
+        if self.top is not None:
+            d["top"] = self.top.to_dict()
+        #Add document ids if present
+        if self.docs is not None:
+            d["docs"] = self.docs.to_dict()
+        return d
     
     @classmethod
     def from_dict(cls, d):
@@ -48,19 +707,88 @@ class Node:
         node = cls()
         #Add counters to node
         node.counters = d.get("counters", counters())
+        #Add document count, older files only have counters so use their sum
+        node.doc_count = d.get("doc_count", sum(node.counters.values()))
+        #Add value statistics if present
+        if "stats" in d:
+            node.stats = ValueStats.from_dict(d["stats"])
+        #Add distinct value sketch if present
+        if "hll" in d:
+            node.hll = HyperLogLog.from_dict(d["hll"])
+        #Add frequent value sketch if present
+        if "top" in d:
+            node.top = SpaceSaving.from_dict(d["top"])
+        #Add document ids if present
+        if "docs" in d:
+            node.docs = DocBitmap.from_dict(d["docs"])
         #Add children to node
         node.children = {key: cls.from_dict(child_dict) for key, child_dict in d.get("children", {}).items()}
         return node
 
 class DataGuide:
-    def __init__(self):
+    def __init__(self, half_life=None, value_stats=False, distinct=False, hll_precision=12, top_k=None,
+                 top_k_total=100000, doc_ids=False, cooccurrence=None, cooccurrence_warmup=1000, projection=None,
+                 instrument=False):
         """
         Initialization method for DataGuide
+        -- If half_life (seconds) is input, counters decay exponentially so recent documents weigh more
+        -- If value_stats is True, numeric ranges, string lengths and array lengths are summarized per path
+        -- If distinct is True, distinct values are estimated per path with HyperLogLog sketches of hll_precision
+        -- If top_k is input, the top_k most frequent values are tracked per path, top_k_total counters overall
+        -- If doc_ids is True, the ids of the documents containing each path are stored in compressed bitmaps
+        -- If cooccurrence is input, pairs of the cooccurrence most common paths are counted per document,
+           the paths are picked after cooccurrence_warmup documents
+        -- If projection (list of paths or patterns) is input, only those subtrees and their ancestors are inserted
+        -- If instrument is True, node counts, classified values and time per phase are gathered for stats
         """
         #Create Node object for root
         self.root = Node()
         #Initialize document counter
         self.total_docs = 0
+        #Half life of decayed counters, None if counters do not decay
+        self.half_life = half_life
+        #Time at which a document has a weight of one, set by first decayed insert
+        self.decay_epoch = None
+        #Boolean based on if value statistics are gathered during insert
+        self.track_value_stats = value_stats
+        #Boolean based on if distinct values are estimated during insert, and precision of sketches
+        self.track_distinct = distinct
+        self.hll_precision = hll_precision
+        #Counters per path and in total for frequent values, None if frequent values are not tracked
+        self.top_k = top_k
+        self.top_k_total = top_k_total
+        #Number of frequent value counters in use
+        self.top_entries = 0
+        #Boolean based on if document ids are stored per path
+        self.track_doc_ids = doc_ids
+        #Id given to the next inserted document
+        self.next_doc_id = 0
+        #Number of paths tracked for co-occurrence, None if co-occurrence is not tracked
+        self.cooccurrence_size = cooccurrence
+        #Number of documents inserted before co-occurrence paths are picked
+        self.cooccurrence_warmup = cooccurrence_warmup
+        #Tracked paths and their nodes, position in list is the row of the path in the matrix
+        self.cooccurrence_paths = []
+        self._cooccurrence_nodes = []
+        #Row of each tracked node by id, and rows whose node was removed (resolved again by path on the next insert)
+        self._cooccurrence_rows = {}
+        self._cooccurrence_missing = set()
+        #Id of the first document counted in matrix
+        self.cooccurrence_start = 0
+        #Co-occurrence matrix stored as a flat array, row * size + column (upper triangle and diagonal only)
+        self.cooccurrence_counts = array("d")
+        #Documents counted in matrix since paths were picked
+        self.cooccurrence_docs = 0
+        #Projection patterns split into segments, None if every path is inserted
+        self.projection = [tuple(pattern.split('.')) for pattern in projection] if projection else None
+        #Epoch of nodes that can be changed in place, changed by snapshot
+        self._epoch = 0
+        #Gathered counts and times, None while instrumentation is disabled
+        self.instrumentation = None
+        #Callbacks of each event, called with data guide and a dictionary about the event
+        self.hooks = {}
+        if instrument:
+            self.enable_instrumentation()
 
     def search(self, path):
         """
@@ -92,158 +820,957 @@ class DataGuide:
                 return None
         #Return leaf node of path
         return current
-    
+
+    def search_many(self, paths):
+        """
+        Method to search a batch of paths, returns a list of booleans in the same order as paths
+        """
+        #Call helper method to move through all paths at once
+        nodes = self._traverse_many(paths)
+        #Return boolean based on if each path is present
+        return [nodes[path] is not None for path in paths]
+
+    def _traverse_many(self, paths):
+        """
+        Helper method to move through a batch of paths in one loop, returns a dictionary of path to node (or None)
+        -- Repeated paths are only traversed once
+        """
+        #Store node of each path
+        nodes = {}
+        #Start of every path
+        root = self.root
+        #Iterate over paths
+        for path in paths:
+            #Skip paths already traversed
+            if path in nodes:
+                continue
+            current = root
+            #Root has no keys to move through
+            if path and path != "root":
+                #Move from child to child until path is complete or an end is reached
+                for part in path.split('.'):
+                    current = current.children.get(part)
+                    if current is None:
+                        break
+            nodes[path] = current
+        return nodes
+
     def _get_type(self, value):
         """
         Helper method to return the type of data stored at a key
+        -- Instrumented data guides time classification and count values per type
         """
+        #Start timing if instrumentation is enabled
+        stats = self.instrumentation
+        if stats is not None:
+            start = time.perf_counter()
         #Check if value is dictionary (nested JSON object)
         if isinstance(value, dict):
-            return "obj"
+            type_name = "obj"
         #Check if value is list (array)
         elif isinstance(value, list):
-            return "arr"
+            type_name = "arr"
         #Check if value is integer
         elif isinstance(value, int):
-            return "int"
+            type_name = "int"
         #Check if value is float
         elif isinstance(value, float):
-            return "float"
+            type_name = "float"
         #Check if value is a string (date or string)
         elif isinstance(value, str):
             #Call helper method to check if string contains a date
             if self._is_date(value):
-                return "date"
+                type_name = "date"
             #String does not contain a date
             else:
-                return "str"
+                type_name = "str"
         else:
             #Fallback method, return type of value if not one included
-            return type(value).__name__
+            type_name = type(value).__name__
+        #Count value and time spent classifying it, also kept per thread for timed inserts and deletes
+        if stats is not None:
+            seconds = time.perf_counter() - start
+            stats.add_time("classify", seconds)
+            stats.types[type_name] = stats.types.get(type_name, 0) + 1
+            _CLASSIFY_TIME.seconds += seconds
+        return type_name
         
     def _is_date(self, s):       
        """
        Helper method to check if a string is a date based on regular expression
        """
+       #Count date checks (regular expression matches) if instrumentation is enabled
+       if self.instrumentation is not None:
+           self.instrumentation.date_checks += 1
        #return boolean based on if input string is date
        return bool(re.match(r"\d{4}-\d{2}\d{2}", s))
     
-    def insert_document(self, doc):
+    def insert_document(self, doc, timestamp=None):
         """
         Method used to insert a document into data guide
+        -- Timestamp is only used when counters decay, current time is used if not input
+        -- Each document is given the next document id, in insertion order starting at zero
+        """
+        #Instrumented data guides time the insert, count its documents and run insert hooks
+        if self.instrumentation is not None:
+            docs = len(doc) if isinstance(doc, list) else int(isinstance(doc, dict))
+            self._instrumented("insert", "tree_update", {"docs": docs}, self._insert_documents, doc, timestamp)
+        else:
+            self._insert_documents(doc, timestamp)
+
+    def _insert_documents(self, doc, timestamp=None):
         """
+        Helper method inserting a document or list of documents, insert_document without instrumentation
+        """
+        #Documents weigh one unless counters decay
+        weight = self._decay_weight(timestamp) if self.half_life else 1
+        #Copy root if it is shared with a snapshot
+        if self.root.epoch != self._epoch:
+            self.root = self._writable(self.root)
         #Check if JSON file contains multiple documents
         if isinstance(doc, list):
             #Iterate over documents in file
             for d in doc:
-                self.total_docs += 1
-                self._insert_value(self.root, d)
+                self.total_docs += weight
+                self.next_doc_id += 1
+                #Only insert projected paths if a projection is set
+                if self.projection:
+                    self._insert_projected(self.root, d, self.next_doc_id - 1, weight, self.projection)
+                else:
+                    self._insert_value(self.root, d, self.next_doc_id - 1, weight)
+                #Count pairs of tracked paths in document
+                if self.cooccurrence_size:
+                    self._record_cooccurrence(self.next_doc_id - 1, weight)
         #If single document
         elif isinstance(doc, dict):
-            self.total_docs += 1
-            self._insert_value(self.root, doc)
+            self.total_docs += weight
+            self.next_doc_id += 1
+            #Only insert projected paths if a projection is set
+            if self.projection:
+                self._insert_projected(self.root, doc, self.next_doc_id - 1, weight, self.projection)
+            else:
+                self._insert_value(self.root, doc, self.next_doc_id - 1, weight)
+            #Count pairs of tracked paths in document
+            if self.cooccurrence_size:
+                self._record_cooccurrence(self.next_doc_id - 1, weight)
+
+    def insert_json(self, lines, timestamp=None):
+        """
+        Method to parse JSON text (one document per line, or one document or array per string) and insert it
+        -- Parsing is timed as the parse phase if instrumentation is enabled
+        """
+        #Accept a single string
+        if isinstance(lines, str):
+            lines = [lines]
+        start = time.perf_counter()
+        docs = [json.loads(line) for line in lines if line.strip()]
+        if self.instrumentation is not None:
+            self.instrumentation.add_time("parse", time.perf_counter() - start, len(docs))
+        #Each parsed value may be a document or a list of documents, insert them as one batch
+        batch = []
+        for doc in docs:
+            if isinstance(doc, list):
+                batch.extend(doc)
+            else:
+                batch.append(doc)
+        self.insert_document(batch, timestamp)
 
-    def _insert_value(self, node, value):
+    def _insert_value(self, node, value, doc_id, delta=1):
         """
         Helper method to insert a single value, called recursively on objects and arrays
         """
+        #Count document once per node, repeated occurrences in the same document (arrays) cost nothing extra
+        if node.last_doc != doc_id:
+            node.last_doc = doc_id
+            node.doc_count += delta
+            #Add document to document ids of node
+            if self.track_doc_ids:
+                if node.docs is None:
+                    node.docs = DocBitmap()
+                node.docs.add(doc_id)
         #Check if current value is a dictionary (nested JSON object)
         if isinstance(value, dict):
             #Increment object counter
-            node.update_counter("obj")
+            node.update_counter("obj", delta)
+            #Children and epoch of nodes that can be changed in place
+            children = node.children
+            epoch = self._epoch
             #Iterate over keys and subvalues contained in object
             for key, subvalue in value.items():
-                #Add key if not already present
-                if key not in node.children:
-                    node.children[key] = Node()
+                #Get child, adding key if not already present (or copying child if it is shared with a snapshot)
+                child = children.get(key)
+                if child is None or child.epoch != epoch:
+                    child = self._writable_child(node, key)
                 #Recusive call for children
-                self._insert_value(node.children[key], subvalue)
+                self._insert_value(child, subvalue, doc_id, delta)
         #Check if current value is a list (array)
         elif isinstance(value, list):
             #Increment array counter
-            node.update_counter("arr")
-            #Add * to children if not already present
-            if "*" not in node.children:
-                node.children["*"] = Node()
+            node.update_counter("arr", delta)
+            #Add array length to value statistics
+            if self.track_value_stats:
+                self._record_stats(node, "arr", value)
+            #Get * child, adding it if not already present (or copying it if it is shared with a snapshot)
+            child = node.children.get("*")
+            if child is None or child.epoch != self._epoch:
+                child = self._writable_child(node, "*")
             #Iterate over array elements
             for element in value:
                 #Recursive call for array elements
-                self._insert_value(node.children["*"], element)
+                self._insert_value(child, element, doc_id, delta)
         #Value is not object or array
         else:
             #Return type of value
             type_name = self._get_type(value)
             #Increase counter for value
-            node.update_counter(type_name)
+            node.update_counter(type_name, delta)
+            #Add value to value statistics
+            if self.track_value_stats:
+                self._record_stats(node, type_name, value)
+            #Add value to distinct value sketch
+            if self.track_distinct:
+                self._record_distinct(node, value)
+            #Add value to frequent value sketch
+            if self.top_k:
+                self._record_top(node, value)
+
+    def _insert_projected(self, node, value, doc_id, delta, patterns):
+        """
+        Helper method to insert a value when a projection is set, keys outside the projection are never inserted
+        -- Patterns holds the remaining segments of each pattern that can still match below node
+        """
+        #Values that are not objects or arrays are inserted as usual
+        if not isinstance(value, (dict, list)):
+            self._insert_value(node, value, doc_id, delta)
+            return
+        #Count document once per node
+        if node.last_doc != doc_id:
+            node.last_doc = doc_id
+            node.doc_count += delta
+            #Add document to document ids of node
+            if self.track_doc_ids:
+                if node.docs is None:
+                    node.docs = DocBitmap()
+                node.docs.add(doc_id)
+        #Check if current value is a dictionary (nested JSON object)
+        if isinstance(value, dict):
+            #Increment object counter
+            node.update_counter("obj", delta)
+            #Iterate over keys and subvalues contained in object
+            for key, subvalue in value.items():
+                #Check which patterns match key
+                full, tails = self._match_projection(patterns, key)
+                #Skip keys outside of projection
+                if not full and not tails:
+                    continue
+                #Get child, adding key if not already present (or copying child if it is shared with a snapshot)
+                child = node.children.get(key)
+                if child is None or child.epoch != self._epoch:
+                    child = self._writable_child(node, key)
+                #Key is fully projected, insert whole subvalue
+                if full:
+                    self._insert_value(child, subvalue, doc_id, delta)
+                #Key is an ancestor of projected paths, keep filtering
+                else:
+                    self._insert_projected(child, subvalue, doc_id, delta, tails)
+        #Value is a list (array)
+        else:
+            #Increment array counter
+            node.update_counter("arr", delta)
+            #Add array length to value statistics
+            if self.track_value_stats:
+                self._record_stats(node, "arr", value)
+            #Every element is stored under *, matched once and added even for empty arrays like in _insert_value
+            full, tails = self._match_projection(patterns, "*")
+            if not full and not tails:
+                return
+            child = node.children.get("*")
+            if child is None or child.epoch != self._epoch:
+                child = self._writable_child(node, "*")
+            #Iterate over array elements
+            for element in value:
+                #Star is fully projected, insert whole elements
+                if full:
+                    self._insert_value(child, element, doc_id, delta)
+                #Star is an ancestor of projected paths, keep filtering
+                else:
+                    self._insert_projected(child, element, doc_id, delta, tails)
+
+    def _writable(self, node):
+        """
+        Helper method returning node if it can be changed in place, else a copy of it for the current epoch
+        -- Nodes of older epochs are shared with snapshots, so they are copied the first time they change
+        """
+        #Node was written in current epoch
+        if node.epoch == self._epoch:
+            return node
+        new_node = node.copy(self._epoch)
+        if self.instrumentation is not None:
+            self.instrumentation.nodes_copied += 1
+        #Tracked co-occurrence nodes have to point at the copy
+        if self._cooccurrence_rows:
+            row = self._cooccurrence_rows.pop(id(node), None)
+            if row is not None:
+                self._cooccurrence_nodes[row] = new_node
+                self._cooccurrence_rows[id(new_node)] = row
+        return new_node
+
+    def _writable_child(self, node, key):
+        """
+        Helper method returning the child of a node under key ready to be changed, adding it if not already present
+        -- Node itself has to be writable
+        """
+        child = node.children.get(key)
+        #Create child in current epoch
+        if child is None:
+            child = Node()
+            if self._epoch:
+                child.epoch = self._epoch
+            if self.instrumentation is not None:
+                self.instrumentation.nodes_created += 1
+        #Copy child if it is shared with a snapshot
+        else:
+            child = self._writable(child)
+        node.children[key] = child
+        return child
+
+    def snapshot(self):
+        """
+        Method returning a read only view of the data guide as it is now, at the cost of a few attribute copies
+        -- Nodes are shared until the data guide changes them, changed nodes are copied first (copy on write)
+        """
+        #Create view sharing every attribute, including the root node
+        view = DataGuide.__new__(DataGuide)
+        view.__dict__.update(self.__dict__)
+        #Copy attributes that are changed in place
+        view.cooccurrence_paths = list(self.cooccurrence_paths)
+        view._cooccurrence_nodes = list(self._cooccurrence_nodes)
+        view._cooccurrence_rows = dict(self._cooccurrence_rows)
+        view._cooccurrence_missing = set(self._cooccurrence_missing)
+        view.cooccurrence_counts = array("d", self.cooccurrence_counts)
+        #View is not instrumented
+        view.instrumentation = None
+        view.hooks = {}
+        #Move data guide and view to new epochs, every node is now older than both so neither changes shared nodes
+        self._share_nodes(view)
+        return view
+
+    def _share_nodes(self, *guides):
+        """
+        Helper method to move this data guide and guides sharing nodes with it to new epochs
+        -- Every shared node is then older than each guide, so it is copied before being changed (copy on write)
+        """
+        for guide in (self,) + guides:
+            guide._epoch = next(_EPOCHS)
+
+    def enable_instrumentation(self):
+        """
+        Method to start gathering node counts, classified values and time per phase, returns the Instrumentation object
+        -- Instrumented methods check instrumentation once per call, so a data guide that is not instrumented pays
+           one attribute check
+        """
+        #Already enabled
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation()
+        return self.instrumentation
+
+    def _instrumented(self, event, phase, info, method, *args):
+        """
+        Helper method running method timed as phase, then counting documents of info and calling the hooks of event
+        -- Time this thread spent classifying values is its own phase and is left out of phase
+        """
+        stats = self.instrumentation
+        classify = _CLASSIFY_TIME.seconds
+        start = time.perf_counter()
+        method(*args)
+        seconds = time.perf_counter() - start
+        stats.add_time(phase, seconds - (_CLASSIFY_TIME.seconds - classify))
+        #Documents are counted from the input, other threads inserting at the same time do not change the count
+        if event == "insert":
+            stats.docs_inserted += info["docs"]
+        elif event == "delete":
+            stats.docs_deleted += info["docs"]
+        info["seconds"] = seconds
+        self._run_hooks(event, info)
+
+    def add_hook(self, event, callback):
+        """
+        Method to add a callback called as callback(data guide, info) after each event, enables instrumentation
+        -- Events are insert (each insert_document call, a batch if a list of documents is input), delete and save
+        -- Info holds the documents (or filename) and seconds of the event
+        """
+        self.enable_instrumentation()
+        self.hooks.setdefault(event, []).append(callback)
+
+    def _run_hooks(self, event, info):
+        """
+        Helper method to call the callbacks of an event
+        """
+        for callback in self.hooks.get(event, ()):
+            callback(self, info)
+
+    def stats(self):
+        """
+        Method to return a dictionary of data guide size and, if instrumentation is enabled, gathered counts and times
+        """
+        stats = {"enabled": self.instrumentation is not None, "total_docs": self.total_docs,
+                 "paths": sum(1 for _ in self._walk_paths())}
+        if self.instrumentation is not None:
+            stats.update(self.instrumentation.to_dict())
+        return stats
+
+    def _match_projection(self, patterns, key):
+        """
+        Helper method to match a key against projection patterns
+        -- Returns (full, tails), full is True if a pattern ends at key, tails are the rest of partly matched patterns
+        """
+        #Store remaining segments of patterns matching key
+        tails = []
+        #Iterate over patterns
+        for pattern in patterns:
+            #Check first segment of pattern
+            if _segment_matches(key, pattern[0]):
+                #Pattern ends at key, whole subtree is projected
+                if len(pattern) == 1:
+                    return True, []
+                tails.append(pattern[1:])
+        return False, tails
+
+    def project(self, paths):
+        """
+        Method to return a data guide holding only the input paths (or patterns) with their subtrees and ancestors
+        -- Subtrees are shared with this data guide instead of copied, untouched branches are never visited
+        """
+        #Create new data guide to store projection
+        result = DataGuide()
+        result.total_docs = self.total_docs
+        #Call helper method on root with every pattern split into segments
+        result.root = self._project_node(self.root, [tuple(path.split('.')) for path in paths])
+        #Move both data guides to new epochs so shared subtrees are copied before either changes them
+        self._share_nodes(result)
+        return result
+
+    def _project_node(self, node, patterns):
+        """
+        Helper method to project a node, returns a new node holding the counters of node and its projected children
+        """
+        #Create new node with counters of input node
+        new_node = Node()
+        new_node.counters = node.counters.copy()
+        new_node.doc_count = node.doc_count
+        #Group patterns by matching child key
+        matches = {}
+        #Iterate over patterns
+        for pattern in patterns:
+            head = pattern[0]
+            #Literal segments only need one lookup, wildcard segments check every child (case sensitive on every platform)
+            if any(c in head for c in "*?["):
+                keys = [key for key in node.children if fnmatch.fnmatchcase(key, head)]
+            else:
+                keys = [head] if head in node.children else []
+            #Store rest of pattern (empty if pattern ends at key) for each matching key
+            for key in keys:
+                matches.setdefault(key, []).append(pattern[1:])
+        #Iterate over matched children
+        for key, tails in matches.items():
+            child = node.children[key]
+            #Pattern ends at child, share whole subtree
+            if () in tails:
+                new_node.children[key] = child
+            #Child is an ancestor of projected paths, recursive call on child
+            else:
+                new_node.children[key] = self._project_node(child, tails)
+        return new_node
+
+    def _record_stats(self, node, type_name, value):
+        """
+        Helper method to add a value to the value statistics of a node, creating them on first use
+        """
+        #Create value statistics if node does not have any yet
+        if node.stats is None:
+            node.stats = ValueStats()
+        #Add value
+        node.stats.add(type_name, value)
+
+    def _record_distinct(self, node, value):
+        """
+        Helper method to add a value to the distinct value sketch of a node, creating it on first use
+        """
+        #Create sketch if node does not have one yet
+        if node.hll is None:
+            node.hll = HyperLogLog(self.hll_precision)
+        #Add value
+        node.hll.add(value)
+
+    def _record_top(self, node, value):
+        """
+        Helper method to add a value to the frequent value sketch of a node, creating it on first use
+        -- Sketches only get new counters while fewer than top_k_total counters are in use
+        """
+        #Check if counters are left for the whole guide
+        room = self.top_entries < self.top_k_total
+        #Create sketch if node does not have one yet
+        if node.top is None:
+            #New sketches need room for at least one counter
+            if not room:
+                return
+            node.top = SpaceSaving(self.top_k)
+        #Add value, counting new counters
+        if node.top.add(value, room):
+            self.top_entries += 1
+
+    def top_values(self, path, n=None):
+        """
+        Method to return up to n (value, count, error) tuples of the most frequent values at a path
+        -- Counts are overestimates by at most error, empty list if path has no sketch
+        """
+        #Traverse input path
+        node = self._traverse_path(path)
+        #Return empty list if path has no sketch
+        if node is None or node.top is None:
+            return []
+        return node.top.top(n)
+
+    def _record_cooccurrence(self, doc_id, delta=1):
+        """
+        Helper method to count every pair of tracked paths present in the document that was just inserted
+        -- Tracked nodes were reached by the document if their last document is doc_id, so no path sets are built
+        """
+        #Pick paths once warmup is over
+        if not self._cooccurrence_nodes:
+            if self.next_doc_id >= self.cooccurrence_warmup:
+                self.track_cooccurrence(self.cooccurrence_size)
+            return
+        #Point rows whose node was removed by a delete at the node the document may have added again
+        if self._cooccurrence_missing:
+            self._resolve_tracked(list(self._cooccurrence_missing))
+        #Rows of tracked paths present in document
+        present = [row for row, node in enumerate(self._cooccurrence_nodes) if node.last_doc == doc_id]
+        #Size of matrix rows
+        size = len(self._cooccurrence_nodes)
+        counts = self.cooccurrence_counts
+        #Iterate over pairs of present paths (including path with itself for its document count)
+        for i, row in enumerate(present):
+            base = row * size
+            for column in present[i:]:
+                counts[base + column] += delta
+        self.cooccurrence_docs += delta
+
+    def _remove_cooccurrence(self, present):
+        """
+        Helper method to subtract the pairs of a deleted document, given the rows of the tracked paths it contained
+        -- Counts never go below zero, documents deleted without an id may have been inserted before the paths were picked
+        """
+        size = len(self._cooccurrence_nodes)
+        counts = self.cooccurrence_counts
+        #Iterate over pairs of present paths (including path with itself for its document count)
+        for i, row in enumerate(present):
+            base = row * size
+            for column in present[i:]:
+                counts[base + column] = max(0.0, counts[base + column] - 1)
+        self.cooccurrence_docs = max(0, self.cooccurrence_docs - 1)
+
+    def _resolve_tracked(self, rows):
+        """
+        Helper method to point tracked rows at the current node of their path
+        -- Rows whose path is not present are kept in _cooccurrence_missing, their old node never matches a new document
+        """
+        for row in rows:
+            node = self._traverse_path(self.cooccurrence_paths[row])
+            if node is None:
+                self._cooccurrence_missing.add(row)
+                continue
+            #Replace old node in the rows by id
+            self._cooccurrence_rows.pop(id(self._cooccurrence_nodes[row]), None)
+            self._cooccurrence_nodes[row] = node
+            self._cooccurrence_rows[id(node)] = row
+            self._cooccurrence_missing.discard(row)
+
+    def track_cooccurrence(self, n):
+        """
+        Method to pick the n paths in the most documents for co-occurrence tracking, resetting the matrix
+        """
+        #Keep the n paths in the most documents, ordered by path
+        candidates = ((node.doc_count, path, node) for path, node in self._walk_paths())
+        top = sorted(heapq.nlargest(n, candidates, key=lambda c: c[0]), key=lambda c: c[1])
+        self.cooccurrence_size = n
+        self.cooccurrence_paths = [path for _, path, _ in top]
+        self._cooccurrence_nodes = [node for _, _, node in top]
+        self._cooccurrence_rows = {id(node): row for row, node in enumerate(self._cooccurrence_nodes)}
+        self._cooccurrence_missing = set()
+        #Reset matrix
+        self.cooccurrence_counts = array("d", bytes(8 * len(top) * len(top)))
+        self.cooccurrence_docs = 0
+        self.cooccurrence_start = self.next_doc_id
+
+    def cooccurs_with(self, path):
+        """
+        Method to return (path, documents) tuples for the tracked paths found in the same documents as path
+        -- Counts only include documents inserted since the paths were picked, most common first
+        """
+        #Return empty list if path is not tracked
+        if path not in self.cooccurrence_paths:
+            return []
+        #Row of path and size of rows
+        row = self.cooccurrence_paths.index(path)
+        size = len(self.cooccurrence_paths)
+        #Store pairs with a nonzero count
+        pairs = []
+        #Iterate over other tracked paths
+        for other, other_path in enumerate(self.cooccurrence_paths):
+            if other == row:
+                continue
+            #Count is stored in upper triangle
+            count = self.cooccurrence_counts[min(row, other) * size + max(row, other)]
+            if count:
+                pairs.append((other_path, count))
+        #Most common first
+        pairs.sort(key=lambda pair: pair[1], reverse=True)
+        return pairs
+
+    def documents(self, path):
+        """
+        Method to return a bitmap of the ids of documents containing a path
+        -- Empty bitmap if path is not present or document ids are not tracked
+        """
+        #Traverse input path
+        node = self._traverse_path(path)
+        #Return empty bitmap if path has no document ids
+        if node is None or node.docs is None:
+            return DocBitmap()
+        #Return a copy so changes to the result never reach the data guide
+        return DocBitmap.from_runs(node.docs.runs())
+
+    def cooccurrence(self, path1, path2):
+        """
+        Method to return the number of documents containing both paths, requires document ids
+        """
+        #Intersect document ids of both paths
+        return len(self.documents(path1) & self.documents(path2))
+
+    def distinct(self, path):
+        """
+        Method to return the estimated number of distinct values at a path, None if path has no sketch
+        """
+        #Traverse input path
+        node = self._traverse_path(path)
+        #Return none if path has no sketch
+        if node is None or node.hll is None:
+            return None
+        return node.hll.count()
+
+    def value_stats(self, path):
+        """
+        Method to return the value statistics of a path, None if path is not present or has no statistics
+        """
+        #Traverse input path
+        node = self._traverse_path(path)
+        #Return none if path has no statistics
+        if node is None or node.stats is None:
+            return None
+        return node.stats.summary()
+
+    def _decay_weight(self, timestamp=None):
+        """
+        Helper method to return the weight of a document inserted at timestamp when counters decay
+        -- Counters are stored relative to decay_epoch, so older counts never have to be updated when time passes
+        """
+        #Use current time if no timestamp is input
+        if timestamp is None:
+            timestamp = time.time()
+        #First decayed document sets the epoch
+        if self.decay_epoch is None:
+            self.decay_epoch = timestamp
+        #Weight doubles every half life after the epoch
+        weight = 2.0 ** ((timestamp - self.decay_epoch) / self.half_life)
+        #Rescale counters before weights get too large for floats
+        if weight > DECAY_REBASE_LIMIT:
+            self._rebase_decay(timestamp)
+            weight = 1.0
+        return weight
+
+    def _rebase_decay(self, timestamp):
+        """
+        Helper method to move the decay epoch to timestamp, scaling every counter to the new epoch
+        -- Only needed once every few hundred half lives
+        """
+        #Factor converting counters to the new epoch
+        scale = self.decay_scale(timestamp)
+        #Scale document counter
+        self.total_docs *= scale
+        #Stack of nodes to scale, starting at root (copied if it is shared with a snapshot)
+        self.root = self._writable(self.root)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            #Scale every counter of node
+            for type_name in node.counters:
+                node.counters[type_name] *= scale
+            node.doc_count *= scale
+            #Add children to stack, copying children shared with a snapshot
+            for key in list(node.children):
+                stack.append(self._writable_child(node, key))
+        #Set new epoch
+        self.decay_epoch = timestamp
+
+    def decay_scale(self, now=None):
+        """
+        Method to return the factor converting stored counters to decayed counts at time now
+        -- Returns one if counters do not decay
+        """
+        #Counters are exact if they do not decay or nothing was inserted yet
+        if not self.half_life or self.decay_epoch is None:
+            return 1.0
+        #Use current time if now is not input
+        if now is None:
+            now = time.time()
+        #Counters halve every half life after the epoch
+        return 2.0 ** ((self.decay_epoch - now) / self.half_life)
+
+    def decayed_counters(self, path=None, now=None):
+        """
+        Method to return the counters of a path decayed to time now
+        """
+        #Traverse input path
+        node = self._traverse_path(path)
+        #If path is not present return empty counters dictionary
+        if node is None:
+            return counters()
+        #Get decay factor
+        scale = self.decay_scale(now)
+        #Scale each counter of node
+        return {type_name: count * scale for type_name, count in node.counters.items()}
     
-    #Not properly deleting documents#########################
-    def delete_document(self, doc):
+    def delete_document(self, doc, doc_id=None):
+        """
+        Method to delete document from data guide
+        -- If document ids are tracked, doc_id (given on insert) is removed from the document ids of each path
+        """
+        #Check if JSON file contains multiple documents, delete them as one batch
+        if isinstance(doc, list):
+            self.delete_many(doc, doc_id)
+        #Single document is walked directly, building a batch data guide would cost more than the delete
+        #Instrumented data guides time the delete and run delete hooks
+        elif self.instrumentation is not None:
+            self._instrumented("delete", "delete", {"docs": 1}, self._delete_document, doc, doc_id)
+        else:
+            self._delete_document(doc, doc_id)
+
+    def _delete_document(self, doc, doc_id=None):
+        """
+        Helper method to delete a single document in one walk
+        -- Nodes reached are stamped with a new negative id, so repeated occurrences (arrays) only decrement doc_count once
+        """
+        if self.half_life:
+            raise ValueError("documents cannot be deleted from a data guide whose counters decay")
+        #Decrement document counter, ensure negative document amount does not occur
+        self.total_docs = max(0, self.total_docs - 1)
+        #Call helper method to update data guide, copying root if it is shared with a snapshot
+        self.root = self._writable(self.root)
+        stamp = next(_DELETE_STAMPS)
+        self._delete_value(self.root, doc, stamp, doc_id)
+        #Subtract pairs of tracked paths the document reached, unless its id shows it was inserted before they were picked
+        if self._cooccurrence_nodes and (doc_id is None or doc_id >= self.cooccurrence_start):
+            self._remove_cooccurrence([row for row, node in enumerate(self._cooccurrence_nodes) if node.last_doc == stamp])
+
+    def _delete_value(self, node, value, stamp, doc_id=None):
+        """
+        Helper method to decrement the counters of a single value, called recursively on objects and arrays
+        -- Node has to be writable, children shared with a snapshot are copied before changing
+        """
+        #Decrement document count once per node and remove document id
+        if node.last_doc != stamp:
+            node.last_doc = stamp
+            node.doc_count -= 1
+            if doc_id is not None and node.docs is not None:
+                node.docs.discard(doc_id)
+        #Check if value is a dictionary (nested JSON object)
+        if isinstance(value, dict):
+            #Decrement object counter
+            node.update_counter("obj", delta=-1)
+            #Iterate over key value pairs
+            for key, subvalue in value.items():
+                #Skip keys that are not in data guide
+                if key not in node.children:
+                    continue
+                #Recursive call for child, copying it if it is shared with a snapshot
+                child = self._writable_child(node, key)
+                self._delete_value(child, subvalue, stamp, doc_id)
+                self._prune_child(node, key, child)
+        #Check if value is a list (array)
+        elif isinstance(value, list):
+            #Decrement array counter
+            node.update_counter("arr", delta=-1)
+            #Check for values stored in array
+            if "*" in node.children:
+                child = self._writable_child(node, "*")
+                #Iterate over values stored in array
+                for element in value:
+                    #Recursive call for array elements
+                    self._delete_value(child, element, stamp, doc_id)
+                self._prune_child(node, "*", child)
+        #Not object or array
+        else:
+            #Decrement counter of type stored
+            node.update_counter(self._get_type(value), delta=-1)
+
+    def _prune_child(self, node, key, child):
+        """
+        Helper method to remove the child under key once all its counters are zero and it has no children
+        -- The * child of a node still holding arrays is kept, empty arrays add it without counting anything
+        """
+        if (not child.children and all(count <= 0 for count in child.counters.values())
+                and not (key == "*" and node.counters.get("arr", 0) > 0)):
+            #Remove key from children
+            del node.children[key]
+            if self.instrumentation is not None:
+                self.instrumentation.nodes_pruned += 1
+            #Tracked path is resolved again once a document adds it back
+            if self._cooccurrence_rows and id(child) in self._cooccurrence_rows:
+                self._cooccurrence_missing.add(self._cooccurrence_rows[id(child)])
+
+    def delete_many(self, docs, doc_ids=None):
+        """
+        Method to delete a batch of documents from data guide
+        -- Counters of the batch are summed first so each path is decremented and checked for removal once
+        -- If document ids are tracked, doc_ids holds the id of each document (given on insert)
+        -- Not supported when counters decay, the weight each document was inserted with is not stored
+        """
+        #Instrumented data guides time the delete, count its documents and run delete hooks
+        if self.instrumentation is not None:
+            docs = list(docs)
+            self._instrumented("delete", "delete", {"docs": len(docs)}, self._delete_batch, docs, doc_ids)
+        else:
+            self._delete_batch(docs, doc_ids)
+
+    def _delete_batch(self, docs, doc_ids=None):
+        """
+        Helper method deleting a batch of documents, delete_many without instrumentation
+        """
+        if self.half_life:
+            raise ValueError("documents cannot be deleted from a data guide whose counters decay")
+        #Create guide to hold the combined counters (and document ids) of the batch
+        batch = DataGuide(doc_ids=doc_ids is not None)
+        #Rows of the tracked paths contained by each document counted in co-occurrence matrix
+        tracked = []
+        #Insert each document of the batch
+        for i, doc in enumerate(docs):
+            #Give document its original id
+            if doc_ids is not None:
+                batch.next_doc_id = doc_ids[i]
+            batch.insert_document(doc)
+            #Tracked paths are looked up in the batch, whose nodes were reached by the document if their last document is its id
+            if self._cooccurrence_nodes and (doc_ids is None or doc_ids[i] >= self.cooccurrence_start):
+                nodes = (batch._traverse_path(path) for path in self.cooccurrence_paths)
+                tracked.append([row for row, node in enumerate(nodes) if node is not None and node.last_doc == batch.next_doc_id - 1])
+        #Decrement document counter, ensure negative document amount does not occur
+        self.total_docs = max(0, self.total_docs - batch.total_docs)
+        #Call helper method to subtract batch from data guide, copying root if it is shared with a snapshot
+        self.root = self._writable(self.root)
+        self._decrement_nodes(self.root, batch.root)
+        #Subtract pairs of tracked paths
+        for present in tracked:
+            self._remove_cooccurrence(present)
+
+    def _decrement_nodes(self, node, batch_node):
+        """
+        Helper method to subtract the counters of a batch node from a node, removing children left with no counts
+        -- Node has to be writable, children shared with a snapshot are copied before changing
+        """
+        #Iterate over counters of batch node
+        for type_name, count in batch_node.counters.items():
+            #Only update types present in the batch
+            if count:
+                node.update_counter(type_name, delta=-count)
+        #Decrement document count
+        node.doc_count -= batch_node.doc_count
+        #Remove document ids of batch if both nodes have them
+        if node.docs is not None and batch_node.docs is not None:
+            node.docs = node.docs - batch_node.docs
+        #Iterate over children of batch node
+        for key, batch_child in batch_node.children.items():
+            #Skip keys that are not in data guide
+            if key not in node.children:
+                continue
+            #Get matching child in data guide
+            child = self._writable_child(node, key)
+            #Recursive call for child nodes
+            self._decrement_nodes(child, batch_child)
+            #Remove child if it was left empty (its children are already pruned above)
+            self._prune_child(node, key, child)
+
+    def print_guide(self, fp=None):
+        """
+        Method to print the data stored in a dataguide, to fp if input (an open file handle) else standard output
         """
-        Method to delete document from data guide
+        #Print to standard output if no file handle is input
+        if fp is None:
+            fp = sys.stdout
+        #Line of root node followed by a line per path
+        lines = itertools.chain([f"root: {self.root.counters}\n"],
+                                (f"root.{path}: {node.counters}\n" for path, node in self._walk_paths()))
+        _write_rows(fp, lines, "".join)
+
+    def export_table(self, fp, delimiter="\t", header=True):
         """
-        #Decrement document counter, ensure negative document amount does not occur
-        self.total_docs = max(0, self.total_docs - 1)
-        #Call helper method to update data guide
-        self._delete_value(self.root, doc)
+        Method to write one row per path to an open file handle (tab separated by default, delimiter="," for CSV)
+        -- Columns are path, one count per counter type, other (counts of any other types), documents and presence
+        """
+        #Counter types with their own column
+        types = list(counters())
+        #Total documents used for presence
+        total = self.total_docs
+        #Basic function formatting a list of rows with the csv module
+        def format_rows(rows):
+            buffer = io.StringIO()
+            csv.writer(buffer, delimiter=delimiter, lineterminator="\n").writerows(rows)
+            return buffer.getvalue()
+        #Basic function returning the row of a path
+        def row(path, node):
+            #Counts of types with a column
+            row = [path] + [node.counters.get(t, 0) for t in types]
+            #Sum counts of types without a column
+            row.append(sum(count for t, count in node.counters.items() if t not in types) if len(node.counters) > len(types) else 0)
+            #Documents containing path and their share of all documents
+            row.append(node.doc_count)
+            row.append(f"{node.doc_count / total:.6g}" if total else "0")
+            return row
+        #Column names followed by a row per path
+        rows = (row(path, node) for path, node in self._walk_paths())
+        if header:
+            rows = itertools.chain([["path"] + types + ["other", "documents", "presence"]], rows)
+        _write_rows(fp, rows, format_rows)
 
-    def _delete_value(self, node, value):
+    def iter_paths(self, prefix=None, filter=None):
         """
-        Helper method to delete keys and decrement counters for a document
+        Method returning an iterator of (path, node) for every path below prefix (whole data guide if None)
+        -- Paths are built only when visited, using an explicit stack in the same order as a recursive walk
+        -- If filter (function taking path and node) is input, only paths it returns True for are yielded
         """
-        #Check if value is a dictionary (nested JSON object)
-        if isinstance(value, dict):
-            #Decrement object counter
-            node.update_counter("obj", delta=-1)
-            #Initialization of list to store keys to be removed
-            keys_to_delete = []
-            #Iterate over key value pairs
-            for key, subvalue in value.items():
-                #Check if key is in current nodes children
-                if key in node.children:
-                    #Recursive call to function for children nodes
-                    self._delete_value(node.children[key], subvalue)
-                    #Check if all counters are zero and node does not have any children
-                    if all(count <= 0 for count in node.children[key].counters.values()) and not node.children[key].children:
-                        #Add key to list for deletion
-                        keys_to_delete.append(key)
-            #Iterate of keys in list
-            for key in keys_to_delete:
-                #Remove key from children list
-                del node.children[key]
-        #Check if value is a list (array)
-        elif isinstance(value, list):
-            #Decrement array counter
-            node.update_counter("arr", delta=-1)
-            #Check for values stored in array
-            if "*" in node.children:
-                #Iterate over values stored in array
-                for element in value:
-                    #Recursive call to function for array elements
-                    self._delete_value(node.children["*"], element)
-                #Check if all counters are zero and array node does not have children
-                if all(count <= 0 for count in node.children["*"].counters.values()) and not node.children["*"].children:
-                    #Delete array children
-                    del node.children["*"]
-        #Not object or array
-        else:
-            #Return type stored
-            type_name = self._get_type(value)
-            #Update counter of type stored
-            node.update_counter(type_name, delta=-1)
-        
-    def print_guide(self):
+        return self._walk_paths(prefix, filter)
+
+    def _walk_paths(self, prefix=None, filter=None):
         """
-        Method to print the data stored in a dataguide
+        Helper method yielding (path, node) for every path below prefix, used by every method walking paths
+        -- Subclasses can wrap iter_paths (with locks or snapshots) without changing the walks of other methods
         """
-        #Submethod to print individual node in data guide
-        def _print_node(node, path="root"):
-            #Print key and counters dictionary for node
-            print(f"{path}: {node.counters}")
-            #Recursive call to function for child nodes
-            for key, child in node.children.items():
-                _print_node(child, path + "." + key)
-        #Start by printing root node
-        _print_node(self.root)
+        #Get node to start from, nothing to yield if prefix is not present
+        start = self.root if prefix is None else self._traverse_path(prefix)
+        if start is None:
+            return
+        #Root has no path
+        if prefix == "root":
+            prefix = None
+        #Stack of paths and nodes still to visit, children in reverse so they are visited in insertion order
+        stack = [(key if not prefix else prefix + "." + key, child) for key, child in reversed(start.children.items())]
+        while stack:
+            path, node = stack.pop()
+            #Yield path unless filtered out
+            if filter is None or filter(path, node):
+                yield path, node
+            #Add children of node
+            for key, child in reversed(node.children.items()):
+                stack.append((path + "." + key, child))
 
     def clear(self):
         """
@@ -253,11 +1780,27 @@ class DataGuide:
         self.root = Node()
         #Reset total docs counter
         self.total_docs = 0
+        #Reset co-occurrence matrix, tracked paths are resolved again once documents add them back
+        if self._cooccurrence_nodes:
+            self._cooccurrence_missing.update(range(len(self._cooccurrence_nodes)))
+            self.cooccurrence_counts = array("d", bytes(8 * len(self.cooccurrence_counts)))
+            self.cooccurrence_docs = 0
+            self.cooccurrence_start = self.next_doc_id
 
     def save(self, filename):
         """
         Method to save data guide as text file
         """
+        #Instrumented data guides time the save and run save hooks
+        if self.instrumentation is not None:
+            self._instrumented("save", "serialize", {"filename": filename}, self._save, filename)
+        else:
+            self._save(filename)
+
+    def _save(self, filename):
+        """
+        Helper method writing data guide to a text file, save without instrumentation
+        """
         #Open/Create file
         with open(filename, "w") as f:
             #Dump data guide contents to file as dictionary
@@ -268,10 +1811,34 @@ class DataGuide:
         Method to convert data guide to dictionary for output
         """
         #Recursive call to iterate through data guide and convert to dictionary
-        return{
+        d = {
             "total_docs": self.total_docs,
             "root": self.root.to_dict()
         }
+        #Store decay settings if counters decay
+        if self.half_life:
+            d["decay"] = {"half_life": self.half_life, "epoch": self.decay_epoch}
+        #Store value statistics setting if enabled
+        if self.track_value_stats:
+            d["value_stats"] = True
+        #Store distinct value setting if enabled
+        if self.track_distinct:
+            d["distinct"] = {"hll_precision": self.hll_precision}
+        #Store frequent value settings if enabled
+        if self.top_k:
+            d["top_k"] = {"capacity": self.top_k, "total": self.top_k_total, "entries": self.top_entries}
+        #Store document id setting if enabled
+        if self.track_doc_ids:
+            d["doc_ids"] = {"next": self.next_doc_id}
+        #Store projection patterns if set
+        if self.projection:
+            d["projection"] = [".".join(pattern) for pattern in self.projection]
+        #Store co-occurrence settings and matrix if enabled
+        if self.cooccurrence_size:
+            d["cooccurrence"] = {"size": self.cooccurrence_size, "warmup": self.cooccurrence_warmup,
+                                 "paths": self.cooccurrence_paths, "counts": self.cooccurrence_counts.tolist(),
+                                 "docs": self.cooccurrence_docs, "start": self.cooccurrence_start}
+        return d
 
     @classmethod
     def from_dict(cls, d):
@@ -284,6 +1851,39 @@ class DataGuide:
         guide.total_docs = d.get("total_docs", 0)
         #Set root node and recursively call function to iterate through data guide dictionary in text file
         guide.root = Node.from_dict(d.get("root", {}))
+        #Get decay settings if counters decay
+        if "decay" in d:
+            guide.half_life = d["decay"]["half_life"]
+            guide.decay_epoch = d["decay"]["epoch"]
+        #Get value statistics setting
+        guide.track_value_stats = d.get("value_stats", False)
+        #Get distinct value setting
+        if "distinct" in d:
+            guide.track_distinct = True
+            guide.hll_precision = d["distinct"]["hll_precision"]
+        #Get frequent value settings
+        if "top_k" in d:
+            guide.top_k = d["top_k"]["capacity"]
+            guide.top_k_total = d["top_k"]["total"]
+            guide.top_entries = d["top_k"]["entries"]
+        #Get document id setting
+        if "doc_ids" in d:
+            guide.track_doc_ids = True
+            guide.next_doc_id = d["doc_ids"]["next"]
+        #Get projection patterns
+        if "projection" in d:
+            guide.projection = [tuple(pattern.split('.')) for pattern in d["projection"]]
+        #Get co-occurrence settings and matrix
+        if "cooccurrence" in d:
+            guide.cooccurrence_size = d["cooccurrence"]["size"]
+            guide.cooccurrence_warmup = d["cooccurrence"]["warmup"]
+            guide.cooccurrence_paths = d["cooccurrence"]["paths"]
+            #Resolve nodes of tracked paths, paths not present are resolved once a document adds them
+            guide._cooccurrence_nodes = [Node() for _ in guide.cooccurrence_paths]
+            guide._resolve_tracked(range(len(guide.cooccurrence_paths)))
+            guide.cooccurrence_counts = array("d", d["cooccurrence"]["counts"])
+            guide.cooccurrence_docs = d["cooccurrence"]["docs"]
+            guide.cooccurrence_start = d["cooccurrence"].get("start", 0)
         return guide
 
     
@@ -303,7 +1903,7 @@ class DataGuide:
     def core(self):
         """
         Method to return core items from data guide
-        -- A core item is one present in every document
+        -- A core item is one present in every document, based on document counts so arrays are not double counted
         """
         #Create new data guide object for core
         core_guide = DataGuide()
@@ -317,15 +1917,14 @@ class DataGuide:
         """
         Helper method to check if an item appears in every document
         """
-        #Sum total count of types stored at node
-        sum_counts = sum(node.counters.values())
-        #Return none if not a core node
-        if sum_counts != self.total_docs:
+        #Return none if not a core node (decayed counts are floats so allow rounding error)
+        if node.doc_count != self.total_docs and not (self.half_life and math.isclose(node.doc_count, self.total_docs)):
             return None
         #Create a new node to store core nodes
         new_node = Node()
         #Copy core node into core data guide
         new_node.counters = node.counters.copy()
+        new_node.doc_count = node.doc_count
         #Iterate over children of node
         for key, child in node.children.items():
             #Recursive call on child nodes
@@ -335,9 +1934,21 @@ class DataGuide:
                 new_node.children[key] = core_child
         return new_node
     
+    def presence(self, path):
+        """
+        Method to return the fraction of documents containing a path
+        """
+        #Traverse input path
+        node = self._traverse_path(path)
+        #Return zero if path is not present or guide is empty
+        if node is None or not self.total_docs:
+            return 0.0
+        return node.doc_count / self.total_docs
+
     def card(self, path=None):
         """
         Method to extract cardinality from data guide
+        -- If counters decay, counts are decayed to the current time
         """
         #If no path is input, compute cardinality of root
         if path is None:
@@ -350,8 +1961,68 @@ class DataGuide:
             if node is None:
                 return counters()
         #Call sum counters method
-        return self._sum_counters(node)
+        total = self._sum_counters(node)
+        #Decay counts to current time if counters decay
+        if self.half_life:
+            scale = self.decay_scale()
+            total = {key: value * scale for key, value in total.items()}
+        return total
     
+    def card_many(self, paths):
+        """
+        Method to extract cardinality of a batch of paths, returns a dictionary of path to counters
+        -- Deepest paths are summed first, so a path containing another queried path reuses its sum
+        """
+        #Call helper method to move through all paths at once
+        nodes = self._traverse_many(paths)
+        #Store sums already computed by node
+        sums = {}
+        #Get decay factor if counters decay
+        scale = self.decay_scale() if self.half_life else 1
+        #Store result of each path
+        result = {}
+        #Iterate over paths from deepest to shallowest
+        for path in sorted(nodes, key=lambda p: p.count('.') if p and p != "root" else -1, reverse=True):
+            node = nodes[path]
+            #If node holds no values store empty counters dictionary
+            if node is None:
+                result[path] = counters()
+                continue
+            #Call helper method if node was not summed yet
+            if id(node) not in sums:
+                sums[id(node)] = self._sum_counters_shared(node, sums)
+            result[path] = sums[id(node)]
+        #Decay counts to current time if counters decay
+        if scale != 1:
+            result = {path: {key: value * scale for key, value in total.items()} for path, total in result.items()}
+        #Return results in input order
+        return {path: result[path] for path in paths}
+
+    def _sum_counters_shared(self, node, sums):
+        """
+        Helper method to sum the counters of a subtree into one dictionary without recursion
+        -- Children already in sums (by node id) add their stored sum instead of being walked again
+        """
+        #Create empty total dictionary
+        total = {}
+        #Stack of nodes to add, starting at input node
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            #Add counters of node
+            for key, value in current.counters.items():
+                total[key] = total.get(key, 0) + value
+            #Iterate over children of node
+            for child in current.children.values():
+                #Reuse sum of child if already computed
+                child_sum = sums.get(id(child))
+                if child_sum is None:
+                    stack.append(child)
+                else:
+                    for key, value in child_sum.items():
+                        total[key] = total.get(key, 0) + value
+        return total
+
     def _sum_counters(self, node):
         """
         Method to return the sum of counters for path or data guide
@@ -371,22 +2042,239 @@ class DataGuide:
                 #Store key and sum counters
                 total[key] = total.get(key, 0) + value
         return total
+
+    def memory_usage(self, path=None, deep=True):
+        """
+        Method returning the bytes held by the node of a path (root if None) and, if deep, every node below it
+        -- Bytes are split into nodes (node objects and their attributes), children (children dictionaries),
+           counters (counter dictionaries and their values), keys (key strings) and sketches
+        -- Sizes come from sys.getsizeof, node attributes are counted as one pointer each so reading them
+           never builds an instance dictionary, returns None if path is not present
+        """
+        #Get node of path
+        node = self._traverse_path(path)
+        if node is None:
+            return None
+        return self._subtree_memory(node, path or "root", deep)
+
+    def _subtree_memory(self, start, path, deep=True):
+        """
+        Helper method returning the memory usage dictionary of a node and, if deep, every node below it
+        """
+        usage = {"nodes": 0, "children": 0, "counters": 0, "keys": 0, "sketches": 0}
+        count = 0
+        getsizeof = sys.getsizeof
+        #Ids of key strings and document stamps already counted, both are shared by many nodes
+        seen = set()
+        #Stack of nodes still to visit
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            count += 1
+            #Node object, one pointer per attribute after a two pointer header and values that are not shared
+            sketches = [sketch for sketch in (node.stats, node.hll, node.top, node.docs) if sketch is not None]
+            attributes = 4 + len(sketches) + (node.epoch != 0)
+            usage["nodes"] += getsizeof(node) + _POINTER_SIZE * (attributes + 2) + _value_size(node.doc_count)
+            #Last document stamp is the same object in every node reached by a document
+            if id(node.last_doc) not in seen:
+                seen.add(id(node.last_doc))
+                usage["nodes"] += _value_size(node.last_doc)
+            #Counters dictionary, type names are shared by every node
+            usage["counters"] += getsizeof(node.counters) + sum(_value_size(value) for value in node.counters.values())
+            #Children dictionary and its key strings
+            usage["children"] += getsizeof(node.children)
+            for key in node.children:
+                #Keys such as * and keys parsed from the same document are shared between children dictionaries
+                if id(key) not in seen:
+                    seen.add(id(key))
+                    usage["keys"] += getsizeof(key)
+            for sketch in sketches:
+                usage["sketches"] += _deep_sizeof(sketch)
+            #Add children of node
+            if deep:
+                stack.extend(node.children.values())
+        return {"path": path, "node_count": count, "bytes": usage, "total": sum(usage.values())}
+
+    def memory_report(self, n=10, depth=1):
+        """
+        Method returning the n paths at depth (1 is top-level keys) holding the most bytes, largest first
+        -- Each entry holds the memory_usage of the path's subtree and its share of the whole data guide
+        """
+        #Bytes of whole data guide
+        total = self._subtree_memory(self.root, "root")["total"]
+        #Subtrees at depth do not overlap and nodes above them are visited once, so the data guide is walked twice in total
+        #Stack of (path, node, depth) still to visit, nodes below depth are only reached through the subtrees measured
+        stack = [(key, child, 1) for key, child in reversed(self.root.children.items())]
+        report = []
+        while stack:
+            path, node, level = stack.pop()
+            if level == depth:
+                report.append(self._subtree_memory(node, path))
+            else:
+                stack.extend((path + "." + key, child, level + 1) for key, child in reversed(node.children.items()))
+        for usage in report:
+            usage["share"] = usage["total"] / total
+        return heapq.nlargest(n, report, key=lambda usage: usage["total"])
     
+    def export_json_schema(self, fp):
+        """
+        Method to write the data guide as a JSON Schema to an open file handle
+        -- Schema is written in pieces while walking the guide, so no schema dictionary is built in memory
+        """
+        #Stack of schema generators, one per node currently being written
+        stack = [self._schema_parts(self.root, True)]
+        #Pieces waiting to be written
+        buffer = []
+        while stack:
+            #Get next piece of current node
+            part = next(stack[-1], None)
+            #Node is finished
+            if part is None:
+                stack.pop()
+            #Child node, write its schema in place
+            elif isinstance(part, Node):
+                stack.append(self._schema_parts(part))
+            #Text piece
+            else:
+                buffer.append(part)
+                #Write pieces in large chunks
+                if len(buffer) >= 4096:
+                    fp.write("".join(buffer))
+                    buffer.clear()
+        #Write remaining pieces
+        fp.write("".join(buffer))
+
+    def _schema_parts(self, node, root=False):
+        """
+        Helper method yielding the JSON Schema of a node as text pieces, child nodes are yielded to be written in place
+        -- A key is required if it appears in every object stored at node (its counter total equals the object count)
+        """
+        #Types stored at node
+        types = [SCHEMA_TYPES[t] for t, count in node.counters.items() if count > 0 and t in SCHEMA_TYPES]
+        #Remove repeated string type (str and date)
+        types = list(dict.fromkeys(types))
+        #Start schema
+        yield "{"
+        #Fields already written, used to place commas
+        fields = 0
+        #Root holds schema version
+        if root:
+            yield '"$schema": "https://json-schema.org/draft/2020-12/schema"'
+            fields += 1
+        #Add type, list of types if more than one
+        if types:
+            yield (", " if fields else "") + '"type": ' + json.dumps(types[0] if len(types) == 1 else types)
+            fields += 1
+        #Dates are plain strings, the date counter also counts forms that are not RFC 3339 dates so no format is added
+        #Object keys, * holds array elements
+        keys = [key for key in node.children if key != "*"]
+        #Objects list their keys
+        if node.counters.get("obj", 0) > 0 and keys:
+            #Number of objects stored at node
+            objects = node.counters["obj"]
+            #Keys present in every object
+            required = []
+            for key in keys:
+                total = sum(node.children[key].counters.values())
+                if total >= objects or math.isclose(total, objects):
+                    required.append(key)
+            if required:
+                yield (", " if fields else "") + '"required": ' + json.dumps(required)
+                fields += 1
+            #Write each key and its schema
+            yield (", " if fields else "") + '"properties": {'
+            fields += 1
+            for i, key in enumerate(keys):
+                yield (", " if i else "") + json.dumps(key) + ": "
+                yield node.children[key]
+            yield "}"
+        #Arrays describe their elements
+        if "*" in node.children:
+            yield (", " if fields else "") + '"items": '
+            yield node.children["*"]
+        #End schema
+        yield "}"
+
     def union(self, other):
         """
         Method used to union two dataguides, other is a second dataguide
         """
-        #Create new guide to store union
-        new_guide = DataGuide()
+        #Distinct value sketches can only be merged with the same precision, taken from the guide that has them
+        if self.track_distinct and other.track_distinct and self.hll_precision != other.hll_precision:
+            raise ValueError("data guides with different distinct value precisions cannot be unioned")
+        hll_precision = self.hll_precision if self.track_distinct else other.hll_precision
+        #Create new guide to store union, keeping value statistics and sketches if either guide has them
+        new_guide = DataGuide(value_stats=self.track_value_stats or other.track_value_stats,
+                              distinct=self.track_distinct or other.track_distinct, hll_precision=hll_precision,
+                              top_k=self.top_k or other.top_k, top_k_total=max(self.top_k_total, other.top_k_total))
+        #Decayed counters of both guides are scaled to the later of their epochs before being added
+        scale1 = scale2 = 1
+        if self.half_life or other.half_life:
+            if self.half_life != other.half_life:
+                raise ValueError("data guides with different half lives cannot be unioned")
+            epochs = [epoch for epoch in (self.decay_epoch, other.decay_epoch) if epoch is not None]
+            new_guide.half_life = self.half_life
+            new_guide.decay_epoch = max(epochs) if epochs else None
+            if epochs:
+                scale1 = self.decay_scale(new_guide.decay_epoch)
+                scale2 = other.decay_scale(new_guide.decay_epoch)
         #Add total docs of each guide together and assign
-        new_guide.total_Docs = self.total_docs + other.total_docs
-        #Call helper method to union the nodes
-        new_guide.root = self._union_nodes(self.root, other.root)
+        new_guide.total_docs = self.total_docs * scale1 + other.total_docs * scale2
+        #Document ids of other guide are moved after the ids of this guide if both store them
+        new_guide.track_doc_ids = self.track_doc_ids and other.track_doc_ids
+        offset = self.next_doc_id if new_guide.track_doc_ids else 0
+        new_guide.next_doc_id = self.next_doc_id + other.next_doc_id
+        #Call helper method to union the nodes, dropping document ids if only one guide stores them
+        new_guide.root = self._union_nodes(self.root, other.root, offset, scale1, scale2, new_guide.track_doc_ids)
+        #Union shares nodes (and sketches) with both guides, so each copies them before changing them
+        self._share_nodes(new_guide, other)
+        #Union holds paths inserted through either projection, so it keeps both (no projection if either has none)
+        if self.projection and other.projection:
+            new_guide.projection = self.projection + [p for p in other.projection if p not in self.projection]
+        #Recount counters in use by merged sketches, keeping the cap of the guides
+        if new_guide.top_k:
+            new_guide._trim_top()
         return new_guide
+
+    def _trim_top(self):
+        """
+        Helper method to recount the counters in use by frequent value sketches, dropping the least frequent values
+        beyond top_k_total
+        """
+        #Store (count, path, value) of every tracked value
+        entries = []
+        stack = [((), self.root)]
+        while stack:
+            path, node = stack.pop()
+            if node.top is not None:
+                entries.extend((count, path, value) for value, count in node.top.counts.items())
+            stack.extend((path + (key,), child) for key, child in node.children.items())
+        self.top_entries = min(len(entries), self.top_k_total)
+        if len(entries) <= self.top_k_total:
+            return
+        #Group least frequent values by path
+        drop = {}
+        for _, path, value in heapq.nsmallest(len(entries) - self.top_k_total, entries, key=lambda entry: entry[0]):
+            drop.setdefault(path, []).append(value)
+        #Remove values from sketches, copying nodes shared with other guides first
+        self.root = self._writable(self.root)
+        for path, values in drop.items():
+            node = self.root
+            for key in path:
+                node = self._writable_child(node, key)
+            for value in values:
+                del node.top.counts[value]
+                del node.top.errors[value]
+            #Sketches left empty are removed
+            if not node.top.counts:
+                node.top = None
     
-    def _union_nodes(self, node1, node2):
+    def _union_nodes(self, node1, node2, offset=0, scale1=1, scale2=1, keep_docs=True):
         """
         Helper method used to combine two nodes, one from each guide, into new node
+        -- Offset is added to the document ids of node2
+        -- Counts of node1 and node2 are multiplied by scale1 and scale2 (decayed counters moved to a common epoch)
+        -- Document ids are left out of the new nodes if keep_docs is false
         """
         #Create new node to store key and value counts
         new_node = Node()
@@ -395,7 +2283,32 @@ class DataGuide:
         #Iterate over types
         for t in all_types:
             #Combine counters of nodes
-            new_node.counters[t] = node1.counters.get(t, 0) + node2.counters.get(t, 0)
+            new_node.counters[t] = node1.counters.get(t, 0) * scale1 + node2.counters.get(t, 0) * scale2
+        #Combine document counts of nodes
+        new_node.doc_count = node1.doc_count * scale1 + node2.doc_count * scale2
+        #Combine value statistics of nodes if present
+        if node1.stats is not None and node2.stats is not None:
+            new_node.stats = node1.stats.merge(node2.stats)
+        else:
+            new_node.stats = node1.stats if node1.stats is not None else node2.stats
+        #Combine distinct value sketches of nodes if present
+        if node1.hll is not None and node2.hll is not None:
+            new_node.hll = node1.hll.merge(node2.hll)
+        else:
+            new_node.hll = node1.hll if node1.hll is not None else node2.hll
+        #Combine frequent value sketches of nodes if present
+        if node1.top is not None and node2.top is not None:
+            new_node.top = node1.top.merge(node2.top)
+        else:
+            new_node.top = node1.top if node1.top is not None else node2.top
+        #Combine document ids of nodes, moving ids of node2 by offset
+        docs2 = node2.docs.shifted(offset) if node2.docs is not None and offset else node2.docs
+        if not keep_docs:
+            new_node.docs = None
+        elif node1.docs is not None and docs2 is not None:
+            new_node.docs = node1.docs | docs2
+        else:
+            new_node.docs = node1.docs if node1.docs is not None else docs2
         #Get all child keys of root nodes
         all_keys = set(node1.children.keys()) | set(node2.children.keys())
         #Iterate over child keys
@@ -406,11 +2319,17 @@ class DataGuide:
             #If both keys are the same
             if child1 and child2:
                 #Recursive call on child nodes
-                new_node.children[key] = self._union_nodes(child1, child2)
+                new_node.children[key] = self._union_nodes(child1, child2, offset, scale1, scale2, keep_docs)
+            #If child1 key is present and its counts have to be scaled or its document ids dropped, copy it
+            elif child1 and (scale1 != 1 or (not keep_docs and child1.docs is not None)):
+                new_node.children[key] = self._union_nodes(child1, Node(), 0, scale1, 1, keep_docs)
             #If child1 key is present
             elif child1:
                 #Add child key to current node's children
                 new_node.children[key] = child1
+            #If child2 key is present and its document ids or counts have to change, copy it with moved ids
+            elif child2 and (offset or scale2 != 1 or (not keep_docs and child2.docs is not None)):
+                new_node.children[key] = self._union_nodes(Node(), child2, offset, 1, scale2, keep_docs)
             #If child2 key is present
             elif child2:
                 #Add child key to current node's children
@@ -431,23 +2350,65 @@ class DataGuide:
         result.root = root_diff if root_diff is not None else Node()
         #Used to store number of unique keys
         uniques_total = 0
-        #Gather paths in each data guide
-        self_paths = set(self._gather_paths(self.root))
-        other_paths = set(self._gather_paths(other.root))
-        #Iterate over unique paths
-        for path in self_paths - other_paths:
-            #Get nodes of path
-            node = self._traverse_path(path)
-            #If a node exists
-            if node:
-                #Sum unique counters
-                uniques_total += sum(node.counters.values())
+        #Iterate over nodes of paths only present in this data guide
+        for node in self._noncommon_nodes(other):
+            #Sum unique counters
+            uniques_total += sum(node.counters.values())
         #Object counter in root set to minimum between total documents and unique counters
         result.root.counters['obj'] = min(self.total_docs, uniques_total)
         #Ensures root atleast has one object
         result._ensure_root_obj()
+        #Every document of the result contains the root
+        result.root.doc_count = result.root.counters['obj']
         return result
 
+    def diff(self, other):
+        """
+        Method to stream a structural diff between data guides, other is treated as the newer data guide
+        -- Yields (path, status, delta) tuples, status is "added", "removed", "retyped" or "changed"
+        -- Delta holds the nonzero counter changes (other minus self) for the path
+        """
+        #Stack of paths still to compare with the node from each guide (None if path is missing from a guide)
+        stack = [("", self.root, other.root)]
+        #Walk both trees at the same time
+        while stack:
+            #Get next path and its nodes
+            path, node1, node2 = stack.pop()
+            #Root node has no path so it is not reported
+            if path:
+                #Get counters of each node, missing nodes have no counts
+                counters1 = node1.counters if node1 is not None else {}
+                counters2 = node2.counters if node2 is not None else {}
+                #Store nonzero counter changes between guides
+                delta = {}
+                #Iterate over types stored in either node (merged dictionary keeps counter order stable)
+                for t in {**counters1, **counters2}:
+                    #Calculate change of counter
+                    change = counters2.get(t, 0) - counters1.get(t, 0)
+                    #Only keep counters that changed
+                    if change:
+                        delta[t] = change
+                #Path only present in other guide
+                if node1 is None:
+                    yield path, "added", delta
+                #Path only present in this guide
+                elif node2 is None:
+                    yield path, "removed", delta
+                #Path present in both guides with a different set of types (int -> str)
+                elif {t for t, c in counters1.items() if c > 0} != {t for t, c in counters2.items() if c > 0}:
+                    yield path, "retyped", delta
+                #Path present in both guides with different counts
+                elif delta:
+                    yield path, "changed", delta
+            #Get children of each node
+            children1 = node1.children if node1 is not None else {}
+            children2 = node2.children if node2 is not None else {}
+            #Add children to stack in reverse order so paths are yielded in sorted order
+            for key in sorted(children1.keys() | children2.keys(), reverse=True):
+                #Add prefix to key if not a child of the root
+                child_path = key if not path else path + "." + key
+                stack.append((child_path, children1.get(key), children2.get(key)))
+
     def _subtract_nodes(self, node1, node2):
         """
         Helper method to compare two nodes and subtract
@@ -462,6 +2423,8 @@ class DataGuide:
             diff = count1 - count2
             #Assign counters to new node
             new_node.counters[type] = diff if diff > 0 else 0
+        #Calculate difference between document counts
+        new_node.doc_count = max(0, node1.doc_count - (node2.doc_count if node2 else 0))
         #Iterate over children in first input node
         for key, child1 in node1.children.items():
             #Get children in second input node
@@ -491,6 +2454,8 @@ class DataGuide:
         copy = Node()
         #Copy counters dictionary from input node
         copy.counters = node.counters.copy()
+        #Copy document count from input node
+        copy.doc_count = node.doc_count
         #Iterate over children of node
         for key, child in node.children.items():
             #Recursive call for child nodes
@@ -504,16 +2469,9 @@ class DataGuide:
         #Save document counts
         m1, m2 = self.total_docs, other.total_docs
         
-        #Save paths of dataguides
-        self_paths = set(self._gather_paths(self.root))
-        other_paths = set(self._gather_paths(other.root))
-        
-        #Paths present in both dataguides
-        common_paths = self_paths & other_paths
-
         #Number of paths in each dataguide not in other dataguide
-        n1 = self._max_noncommon(self_paths, common_paths)
-        n2 = self._max_noncommon(other_paths, common_paths)
+        n1 = self._max_noncommon(other)
+        n2 = other._max_noncommon(self)
 
         #Find minimum difference of document count to noncommon paths between guides
         #This is the number of documents present in the resulting intersection dataguide
@@ -526,79 +2484,84 @@ class DataGuide:
         result = DataGuide()
         result.total_docs = m_int
 
-        #Iterate over common paths
-        for path in sorted(common_paths):
-            #Get nodes of paths
-            n1_node = self._traverse_path(path)
-            n2_node = other._traverse_path(path)
-            #Comb dictionary used to combine common path counts
-            comb = {}
-            #Iterate over counters in nodes
-            for t in set(n1_node.counters) | set(n2_node.counters):
-                #Get counts of each type in each node
-                c1 = n1_node.counters.get(t, 0)
-                c2 = n2_node.counters.get(t, 0)
-                #Get minimum count between common nodes
-                val = min(c1, c2)
-                #If value count is above zero, store count as minimum between value and document count
-                if val > 0:
-                    comb[t] = min(val, m_int)
-                #Else store count as zero for that type
-                else:
-                    comb[t] = 0
-
-            #If entire sum of values in comb dictionary is zero, move to next node
-            if sum(comb.values()) == 0:
-                continue
-
-            #Set current node to root
-            current = result.root
-            #iterate over path nodes
-            for part in path.split('.'):
-                #Create new child node for current node
-                current = current.children.setdefault(part, Node())
-            #Set counters of current node to comb dictionary
-            current.counters = comb
+        #Walk paths present in both dataguides together, starting from children of the root nodes
+        for key in sorted(self.root.children.keys() & other.root.children.keys()):
+            #Call helper method on common child nodes
+            child = self._intersect_nodes(self.root.children[key], other.root.children[key], m_int)
+            #Add child if any of its paths are kept
+            if child is not None:
+                result.root.children[key] = child
         #Set root object counter to number of unqiue documents
         result.root.counters['obj'] = m_int
         #Ensure root object counter has at least one node
         result._ensure_root_obj()
+        #Every document of the result contains the root
+        result.root.doc_count = result.root.counters['obj']
         
         return result
-    
-    def _gather_paths(self, node, prefix=""):
+
+    def _intersect_nodes(self, node1, node2, m_int):
         """
-        Helper method used to get all paths connected to input node
+        Helper method to intersect two nodes of the same path, returns None if neither node nor its children are kept
+        -- Counters are the minimum of both nodes (capped at m_int), common children are intersected in sorted order
         """
-        #Create paths list
-        paths = []
-        #Iterate over key value pairs of child nodes
-        for key, child in node.children.items():
-            #Add key to path, if prefix is present then add prefix with new key added
-            path = key if not prefix else prefix + "." + key
-            #Add path to paths list
-            paths.append(path)
-            #Recursive call with child node and prefix
-            paths.extend(self._gather_paths(child, path))
-        return paths
-    
-    def _max_noncommon(self, all_paths, common_paths):
+        #Comb dictionary used to combine common path counts
+        comb = {}
+        #Iterate over counters in nodes
+        for t in set(node1.counters) | set(node2.counters):
+            #Get minimum count between common nodes
+            val = min(node1.counters.get(t, 0), node2.counters.get(t, 0))
+            #If value count is above zero, store count as minimum between value and document count, else zero
+            comb[t] = min(val, m_int) if val > 0 else 0
+        #Create new node to store intersection
+        new_node = Node()
+        #Iterate over child keys present in both nodes
+        for key in sorted(node1.children.keys() & node2.children.keys()):
+            #Recursive call on common child nodes
+            child = self._intersect_nodes(node1.children[key], node2.children[key], m_int)
+            #Add child if any of its paths are kept
+            if child is not None:
+                new_node.children[key] = child
+        #If entire sum of values in comb dictionary is zero, node is only kept (empty) as the parent of kept children
+        if sum(comb.values()) == 0:
+            return new_node if new_node.children else None
+        #Set counters of node to comb dictionary
+        new_node.counters = comb
+        #Document count can not be above either guide or the intersection size
+        new_node.doc_count = min(node1.doc_count, node2.doc_count, m_int)
+        return new_node
+
+    def _noncommon_nodes(self, other):
         """
-        Helper method used to get maximum total sum of counters between all noncommon path nodes
+        Helper method yielding the nodes of every path of this dataguide not present in other
+        -- Both trees are walked together, subtrees missing from other are yielded whole without further lookups
+        """
+        #Stack of nodes still to visit with the node of the same path in other (None if path is missing from other)
+        stack = [(self.root, other.root)]
+        while stack:
+            node1, node2 = stack.pop()
+            #Iterate over children of node
+            for key, child in node1.children.items():
+                #Get child of same key in other, nothing to look up below a missing path
+                child2 = node2.children.get(key) if node2 is not None else None
+                #Yield child if its path is missing from other
+                if child2 is None:
+                    yield child
+                stack.append((child, child2))
+
+    def _max_noncommon(self, other):
+        """
+        Helper method used to get maximum total sum of counters between all paths not present in other
         """
         #n used to store maximum total sum of counters
         n = 0
         #Iterate over noncommon paths
-        for path in all_paths - common_paths:
-            #Get nodes of noncommon paths
-            node = self._traverse_path(path)
-            #If node is returned
-            if node:
-                #Sum all counter values
-                total = sum(node.counters.values())
-                #If current total is bigger than previous max, replace n
-                if total > n: 
-                    n = total
+        for node in self._noncommon_nodes(other):
+            #Sum all counter values
+            total = sum(node.counters.values())
+            #If current total is bigger than previous max, replace n
+            if total > n: 
+                n = total
         return n
     
     def _ensure_root_obj(self):
@@ -607,3 +2570,460 @@ class DataGuide:
         """
         if self.root.counters['obj'] == 0 and self.root.children != {}:
             self.root.counters['obj'] = 1
+
+class WindowedDataGuide:
+    def __init__(self, window=24, bucket_size=3600, clock=time.time):
+        """
+        Initialization method for WindowedDataGuide
+        -- Keeps a data guide of the documents inserted in the last window buckets, each bucket_size seconds long
+        """
+        #Number of buckets kept in window
+        self.window = window
+        #Length of each bucket in seconds
+        self.bucket_size = bucket_size
+        #Function returning current time, used when no timestamp is input
+        self.clock = clock
+        #Data guide for each bucket in window, keyed by bucket number
+        self.buckets = {}
+        #Running data guide of all buckets in window
+        self.guide = DataGuide()
+        #Newest bucket number seen
+        self.current = None
+        #Whether documents are inserted on the clock, only then do reads move the window to the current time
+        self.live = False
+
+    def insert_document(self, doc, timestamp=None):
+        """
+        Method used to insert a document into the bucket of its timestamp and the running data guide
+        """
+        #Use current time if no timestamp is input, window then follows the clock on reads
+        if timestamp is None:
+            timestamp = self.clock()
+            self.live = True
+        #Expire buckets that are now outside the window
+        self.advance(timestamp)
+        #Get bucket number of document
+        bucket = int(timestamp // self.bucket_size)
+        #Ignore documents older than the window
+        if bucket <= self.current - self.window:
+            return
+        #Create bucket data guide if not already present
+        if bucket not in self.buckets:
+            self.buckets[bucket] = DataGuide()
+        #Insert document into bucket and running data guide
+        self.buckets[bucket].insert_document(doc)
+        self.guide.insert_document(doc)
+
+    def advance(self, timestamp=None):
+        """
+        Method used to move the window forward, expired buckets are subtracted from the running data guide
+        """
+        #Use current time if no timestamp is input
+        if timestamp is None:
+            timestamp = self.clock()
+        #Get bucket number of timestamp
+        bucket = int(timestamp // self.bucket_size)
+        #Window only moves forward
+        if self.current is not None and bucket <= self.current:
+            return
+        self.current = bucket
+        #Iterate over buckets that fell out of the window
+        for expired in [b for b in self.buckets if b <= bucket - self.window]:
+            #Remove bucket from window
+            old = self.buckets.pop(expired)
+            #Subtract bucket from running data guide
+            self.guide.total_docs = max(0, self.guide.total_docs - old.total_docs)
+            self.guide.root = self.guide._writable(self.guide.root)
+            self.guide._decrement_nodes(self.guide.root, old.root)
+
+    def _refresh(self):
+        """
+        Helper method run before reads, moves the window to the current time only if inserts use the clock
+        -- Windows of replayed documents with input timestamps are left where the newest document put them
+        """
+        if self.live:
+            self.advance()
+
+    def search(self, path):
+        """
+        Search method, returns boolean based on if path is present in window
+        """
+        self._refresh()
+        return self.guide.search(path)
+
+    def card(self, path=None):
+        """
+        Method to extract cardinality from window
+        """
+        self._refresh()
+        return self.guide.card(path)
+
+    def core(self):
+        """
+        Method to return core items from window
+        """
+        self._refresh()
+        return self.guide.core()
+
+    def print_guide(self):
+        """
+        Method to print the data stored in window
+        """
+        self._refresh()
+        self.guide.print_guide()
+
+    def save(self, filename):
+        """
+        Method to save data guide of window as text file
+        """
+        self._refresh()
+        self.guide.save(filename)
+
+
+class ConcurrentDataGuide(DataGuide):
+    def __init__(self, shards=64, **options):
+        """
+        Initialization method for ConcurrentDataGuide
+        -- Data guide that can be inserted into and read from by several threads at once
+        -- Top-level keys are spread over shards locks, documents only lock the shards of their keys
+        -- Options are the same as DataGuide
+        """
+        super().__init__(**options)
+        #Lock of each shard, a top-level key belongs to shard hash(key) % shards
+        self.locks = [threading.Lock() for _ in range(shards)]
+        #Lock for root node, document counter, document ids and co-occurrence matrix
+        self.root_lock = threading.Lock()
+        #Lock for number of frequent value counters in use, shared by every shard
+        self._top_lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        """
+        Context manager holding every lock, used for operations reading or changing the whole data guide
+        """
+        #Locks are always taken shards first (in order) then root, so threads never wait on each other in a cycle
+        for lock in self.locks:
+            lock.acquire()
+        self.root_lock.acquire()
+        try:
+            yield self
+        finally:
+            self.root_lock.release()
+            for lock in reversed(self.locks):
+                lock.release()
+
+    def _path_lock(self, path):
+        """
+        Helper method returning the lock to hold while reading path, every lock for root
+        """
+        #Root reads the whole data guide
+        if not path or path == "root":
+            return self.locked()
+        #Lock of shard holding top-level key of path
+        return self.locks[hash(path.split('.', 1)[0]) % len(self.locks)]
+
+    def _insert_documents(self, doc, timestamp=None):
+        """
+        Helper method used to insert a document into data guide, safe to call from several threads
+        """
+        #Iterate over documents in file, or single document
+        for d in doc if isinstance(doc, list) else [doc]:
+            #Only objects are spread over shards, anything else is inserted holding every lock
+            if isinstance(d, dict):
+                self._insert_sharded(d, timestamp)
+            else:
+                with self.locked():
+                    super()._insert_documents([d], timestamp)
+        #Pick co-occurrence paths once warmup is over, walking every path needs every lock
+        if self.cooccurrence_size and not self._cooccurrence_nodes and self.next_doc_id >= self.cooccurrence_warmup:
+            with self.locked():
+                if not self._cooccurrence_nodes:
+                    self.track_cooccurrence(self.cooccurrence_size)
+
+    def _insert_sharded(self, doc, timestamp):
+        """
+        Helper method to insert a single object, holding only the locks of the shards of its top-level keys
+        """
+        #Rescaling decayed counters changes every node, so it is done holding every lock before inserting
+        if self.half_life:
+            self._prepare_decay(timestamp)
+        #Store (key, subvalue, remaining patterns) of keys to insert, patterns are None for whole subvalues
+        items = []
+        for key, subvalue in doc.items():
+            #Skip keys outside of projection
+            if self.projection:
+                full, tails = self._match_projection(self.projection, key)
+                if full or tails:
+                    items.append((key, subvalue, None if full else tails))
+            else:
+                items.append((key, subvalue, None))
+        #Lock shards of keys in order
+        shards = sorted({hash(key) % len(self.locks) for key, _, _ in items})
+        for shard in shards:
+            self.locks[shard].acquire()
+        try:
+            #Count document in root and create missing top-level nodes
+            with self.root_lock:
+                #Shards held stop counters from being rescaled, so weight cannot go over the limit here
+                weight = self._decay_weight(timestamp) if self.half_life else 1
+                self.total_docs += weight
+                #Give document the next document id
+                doc_id = self.next_doc_id
+                self.next_doc_id += 1
+                #Copy root if it is shared with a snapshot
+                root = self.root = self._writable(self.root)
+                root.last_doc = doc_id
+                root.doc_count += weight
+                #Add document to document ids of root
+                if self.track_doc_ids:
+                    if root.docs is None:
+                        root.docs = DocBitmap()
+                    root.docs.add(doc_id)
+                root.update_counter("obj", weight)
+                #Get top-level nodes, adding keys if not already present (or copying nodes shared with a snapshot)
+                children = [self._writable_child(root, key) for key, _, _ in items]
+            #Insert subvalues, other threads can insert into other shards at the same time
+            for child, (key, subvalue, tails) in zip(children, items):
+                if tails is None:
+                    self._insert_value(child, subvalue, doc_id, weight)
+                else:
+                    self._insert_projected(child, subvalue, doc_id, weight, tails)
+            #Count pairs of tracked paths while the shards of the document are still held
+            if self._cooccurrence_nodes:
+                with self.root_lock:
+                    self._record_cooccurrence(doc_id, weight)
+        finally:
+            for shard in reversed(shards):
+                self.locks[shard].release()
+
+    def _prepare_decay(self, timestamp):
+        """
+        Helper method to rescale decayed counters holding every lock if a document at timestamp needs it
+        """
+        #Use current time if no timestamp is input
+        if timestamp is None:
+            timestamp = time.time()
+        #Check weight without changing anything
+        with self.root_lock:
+            if self.decay_epoch is None or 2.0 ** ((timestamp - self.decay_epoch) / self.half_life) <= DECAY_REBASE_LIMIT:
+                return
+        #Rescale counters
+        with self.locked():
+            self._decay_weight(timestamp)
+
+    def _record_top(self, node, value):
+        """
+        Helper method to add a value to the frequent value sketch of a node, number of counters in use is shared by every shard
+        """
+        with self._top_lock:
+            super()._record_top(node, value)
+
+    def snapshot(self):
+        """
+        Method returning a read only view of the data guide, reads of the view never take any lock
+        """
+        with self.locked():
+            view = super().snapshot()
+        #View is a plain data guide
+        del view.locks, view.root_lock, view._top_lock
+        return view
+
+    @staticmethod
+    def _view(guide):
+        """
+        Helper method returning a snapshot of guide if it is a ConcurrentDataGuide, else guide itself
+        -- Methods reading two data guides (union, diff, ...) run on views so they hold no lock while walking
+        """
+        return guide.snapshot() if isinstance(guide, ConcurrentDataGuide) else guide
+
+    def iter_paths(self, prefix=None, filter=None):
+        """
+        Method returning an iterator of (path, node) for every path below prefix, walked on a snapshot
+        -- Inserts can go on while the iterator is consumed, paths inserted after the call are not yielded
+        """
+        return self.snapshot().iter_paths(prefix, filter)
+
+    def union(self, other):
+        """
+        Method to return the union of the data guide and other, computed on snapshots of both
+        """
+        return self.snapshot().union(self._view(other))
+
+    def intersect(self, other):
+        """
+        Method to return the intersection of the data guide and other, computed on snapshots of both
+        """
+        return self.snapshot().intersect(self._view(other))
+
+    def difference(self, other):
+        """
+        Method to return the paths of the data guide not in other, computed on snapshots of both
+        """
+        return self.snapshot().difference(self._view(other))
+
+    def diff(self, other):
+        """
+        Method returning an iterator of the changes from the data guide to other, computed on snapshots of both
+        """
+        return self.snapshot().diff(self._view(other))
+
+    def project(self, paths):
+        """
+        Method to return a data guide holding only the input paths, computed on a snapshot
+        """
+        return self.snapshot().project(paths)
+
+    def decayed_counters(self, path=None, now=None):
+        """
+        Method to return the counters of path scaled to time now
+        """
+        with self._path_lock(path):
+            return super().decayed_counters(path, now)
+
+    def cooccurs_with(self, path):
+        """
+        Method to return the tracked paths found in the same documents as path, co-occurrence matrix is read holding root lock
+        """
+        with self.root_lock:
+            return super().cooccurs_with(path)
+
+    def search(self, path):
+        """
+        Search method, returns boolean based on if path is present in data guide
+        """
+        with self._path_lock(path):
+            return super().search(path)
+
+    def card(self, path=None):
+        """
+        Method to extract cardinality from data guide
+        """
+        with self._path_lock(path):
+            return super().card(path)
+
+    def presence(self, path):
+        """
+        Method to return the fraction of documents containing path
+        """
+        with self._path_lock(path):
+            return super().presence(path)
+
+    def documents(self, path):
+        """
+        Method to return the document ids of path
+        """
+        with self._path_lock(path):
+            return super().documents(path)
+
+    def distinct(self, path):
+        """
+        Method to return the estimated number of distinct values of path
+        """
+        with self._path_lock(path):
+            return super().distinct(path)
+
+    def value_stats(self, path):
+        """
+        Method to return the value statistics of path
+        """
+        with self._path_lock(path):
+            return super().value_stats(path)
+
+    def top_values(self, path, n=None):
+        """
+        Method to return the most frequent values of path
+        """
+        with self._path_lock(path):
+            return super().top_values(path, n)
+
+    def search_many(self, paths):
+        """
+        Method to search a batch of paths
+        """
+        with self.locked():
+            return super().search_many(paths)
+
+    def card_many(self, paths):
+        """
+        Method to extract cardinality of a batch of paths
+        """
+        with self.locked():
+            return super().card_many(paths)
+
+    def core(self):
+        """
+        Method to return core items from data guide
+        """
+        with self.locked():
+            return super().core()
+
+    def delete_many(self, docs, doc_ids=None):
+        """
+        Method to delete a batch of documents from data guide
+        """
+        with self.locked():
+            super().delete_many(docs, doc_ids)
+
+    def _delete_document(self, doc, doc_id=None):
+        """
+        Helper method to delete a single document from data guide
+        """
+        with self.locked():
+            super()._delete_document(doc, doc_id)
+
+    def clear(self):
+        """
+        Method to clear dataguide
+        """
+        with self.locked():
+            super().clear()
+
+    def to_dict(self):
+        """
+        Method to convert data guide to dictionary for output, also used by save
+        """
+        with self.locked():
+            return super().to_dict()
+
+    def print_guide(self, fp=None):
+        """
+        Method to print the data stored in a dataguide
+        """
+        with self.locked():
+            super().print_guide(fp)
+
+    def export_table(self, fp, delimiter="\t", header=True):
+        """
+        Method to write one row per path to an open file handle
+        """
+        with self.locked():
+            super().export_table(fp, delimiter, header)
+
+    def export_json_schema(self, fp):
+        """
+        Method to write a JSON Schema of the data guide to an open file handle
+        """
+        with self.locked():
+            super().export_json_schema(fp)
+
+    def memory_usage(self, path=None, deep=True):
+        """
+        Method returning the bytes held by the node of a path and, if deep, every node below it
+        """
+        with self.locked():
+            return super().memory_usage(path, deep)
+
+    def memory_report(self, n=10, depth=1):
+        """
+        Method returning the n paths at depth holding the most bytes, largest first
+        """
+        with self.locked():
+            return super().memory_report(n, depth)
+
+    def stats(self):
+        """
+        Method to return a dictionary of data guide size and gathered counts and times
+        -- Counts and times are gathered without locking, so they are approximate while several threads insert
+        """
+        with self.locked():
+            return super().stats()
@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+
+from DataGuide import DataGuide
+
+#Basic function to return the pth percentile of a sorted list, None if empty
+def percentile(values, p):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+class DataGuideServer:
+    def __init__(self, guide=None, batch_size=500, batch_delay=0.005, queue_size=10000, line_limit=8 * 2**20, save_dir=None):
+        """
+        Initialization method for DataGuideServer
+        -- Serves a data guide over NDJSON, one JSON request per line and one JSON response per line
+        -- Documents are coalesced into batches of up to batch_size, waiting at most batch_delay seconds for a batch to fill
+        -- At most queue_size requests wait to be applied, readers stop reading from their connection while the queue is full
+        -- Request lines longer than line_limit bytes are dropped and answered with an error
+        -- Save requests can only write files inside save_dir (current directory if not input)
+        """
+        #Data guide served, new empty data guide if not input
+        self.guide = guide if guide is not None else DataGuide()
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.line_limit = line_limit
+        #Directory save requests write into, with symbolic links resolved so filenames can be checked against it
+        self.save_dir = os.path.realpath(save_dir if save_dir is not None else os.getcwd())
+        #Requests waiting to be applied to data guide, in arrival order across every connection
+        self.queue = asyncio.Queue(queue_size)
+        #Task applying queued requests
+        self._batcher = None
+        #Metrics
+        self.docs_received = 0
+        self.docs_inserted = 0
+        self.batches = 0
+        self.queries = 0
+        self.errors = 0
+        self.max_queue = 0
+        #Seconds between receiving and applying recent documents and queries
+        self.insert_latency = deque(maxlen=10000)
+        self.query_latency = deque(maxlen=10000)
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """
+        Method to start serving on host and port, or on a Unix socket if path is input, returns asyncio server
+        """
+        #Start applying queued requests
+        self._batcher = asyncio.create_task(self._apply_requests())
+        #Buffer of each connection holds one request line of up to line_limit bytes
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle_connection, path, limit=self.line_limit)
+        return await asyncio.start_server(self._handle_connection, host, port, limit=self.line_limit)
+
+    async def close(self):
+        """
+        Method to apply every queued request and stop applying new ones
+        """
+        #Wait for queue to empty
+        await self.queue.join()
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Helper method serving one connection, responses are written in request order
+        """
+        #Futures of responses not written yet
+        responses = asyncio.Queue()
+        #Write responses while requests are read
+        writing = asyncio.create_task(self._write_responses(responses, writer))
+        try:
+            #Iterate over request lines
+            while True:
+                line = await self._read_line(reader)
+                #Answer lines that are too long with an error, the connection goes on with the next line
+                if line is None:
+                    self.errors += 1
+                    future = asyncio.get_running_loop().create_future()
+                    future.set_result({"ok": False, "error": f"request line longer than {self.line_limit} bytes"})
+                    responses.put_nowait(future)
+                    continue
+                if not line:
+                    break
+                #Skip empty lines
+                if not line.strip():
+                    continue
+                responses.put_nowait(await self._submit(line))
+        finally:
+            #Mark end of responses and wait for them to be written
+            responses.put_nowait(None)
+            await writing
+            writer.close()
+
+    async def _read_line(self, reader):
+        """
+        Helper method returning the next request line of a connection (empty at end), None if it is longer than line_limit
+        -- The rest of a line that is too long is read and dropped in chunks, so the next request starts on the next line
+        """
+        try:
+            return await reader.readuntil(b"\n")
+        #Last line without newline
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        #Line longer than limit, its bytes stay in the buffer
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+        #Drop line up to its newline
+        try:
+            while True:
+                await reader.readexactly(consumed)
+                try:
+                    await reader.readuntil(b"\n")
+                    return None
+                except asyncio.LimitOverrunError as e:
+                    consumed = e.consumed
+        #Connection closed inside the line
+        except asyncio.IncompleteReadError:
+            return None
+
+    async def _write_responses(self, responses, writer):
+        """
+        Helper method writing response futures of a connection in order as they complete
+        """
+        while True:
+            future = await responses.get()
+            #End of connection
+            if future is None:
+                return
+            writer.write(json.dumps(await future).encode() + b"\n")
+            #Wait for slow clients when nothing else is waiting to be written
+            if responses.empty():
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    return
+
+    async def _submit(self, line):
+        """
+        Helper method to parse a request line and queue it, returns future of its response
+        -- Waits while the queue is full, so a connection is not read faster than requests are applied
+        """
+        #Time request was received, waiting for room in the queue counts towards latency
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        #Parse request
+        try:
+            request = json.loads(line)
+            op = request["op"]
+            #Documents of insert requests, one document or a list of documents
+            if op == "insert":
+                docs = request["docs"] if "docs" in request else [request["doc"]]
+                if not isinstance(docs, list):
+                    raise TypeError("docs must be a list")
+        except (ValueError, KeyError, TypeError) as e:
+            self.errors += 1
+            future.set_result({"ok": False, "error": f"invalid request: {e}"})
+            return future
+        #Documents are acknowledged once queued, queries are answered once every earlier request is applied
+        if op == "insert":
+            self.docs_received += len(docs)
+            future.set_result({"ok": True, "queued": len(docs)})
+            await self.queue.put((op, docs, start, None))
+        else:
+            await self.queue.put((op, request, start, future))
+        #Store largest queue length seen
+        if self.queue.qsize() > self.max_queue:
+            self.max_queue = self.queue.qsize()
+        return future
+
+    async def _apply_requests(self):
+        """
+        Helper method applying queued requests, runs of documents are inserted as one batch
+        """
+        #Documents waiting to be inserted, the time each was received and the number of queued requests they came from
+        batch = []
+        received = []
+        requests = 0
+        while True:
+            #Wait for next request, only as long as batch_delay if a batch is waiting to fill
+            try:
+                if batch:
+                    item = await asyncio.wait_for(self.queue.get(), self.batch_delay)
+                else:
+                    item = await self.queue.get()
+            except asyncio.TimeoutError:
+                item = None
+            #Insert batch when no more documents arrive in time or before a query
+            if item is None or item[0] != "insert":
+                if batch:
+                    self._insert_batch(batch, received, requests)
+                    batch, received, requests = [], [], 0
+                if item is None:
+                    continue
+            op, request, start, future = item
+            #Documents join the batch, which is inserted once full
+            if op == "insert":
+                batch.extend(request)
+                received.extend([start] * len(request))
+                requests += 1
+                if len(batch) >= self.batch_size:
+                    self._insert_batch(batch, received, requests)
+                    batch, received, requests = [], [], 0
+                continue
+            #Queries are answered at once, every earlier request is already applied
+            try:
+                future.set_result(self._query(op, request))
+                self.queries += 1
+                self.query_latency.append(time.perf_counter() - start)
+            #Failed queries are answered with the error, the server keeps running
+            except Exception as e:
+                self.errors += 1
+                future.set_result({"ok": False, "error": f"{type(e).__name__}: {e}"})
+            finally:
+                self.queue.task_done()
+
+    def _insert_batch(self, batch, received, requests):
+        """
+        Helper method to insert a batch of documents coming from a number of queued requests and record their latency
+        """
+        try:
+            self.guide.insert_document(batch)
+            now = time.perf_counter()
+            self.insert_latency.extend(now - start for start in received)
+            self.docs_inserted += len(batch)
+            self.batches += 1
+        #Documents were already acknowledged, so failures are only counted
+        except Exception:
+            self.errors += 1
+        finally:
+            for _ in range(requests):
+                self.queue.task_done()
+
+    def _query(self, op, request):
+        """
+        Helper method to answer a query, returns response dictionary
+        """
+        if op == "search":
+            return {"ok": True, "result": self.guide.search(request["path"])}
+        if op == "card":
+            return {"ok": True, "result": self.guide.card(request.get("path"))}
+        if op == "core":
+            return {"ok": True, "result": self.guide.core().to_dict()}
+        if op == "save":
+            #Resolve filename inside save directory, rejecting names that lead outside it (.., absolute paths, links)
+            filename = os.path.realpath(os.path.join(self.save_dir, request["filename"]))
+            if filename == self.save_dir or os.path.commonpath([self.save_dir, filename]) != self.save_dir:
+                return {"ok": False, "error": f"filename outside save directory: {request['filename']}"}
+            self.guide.save(filename)
+            return {"ok": True}
+        if op == "metrics":
+            return {"ok": True, "result": self.metrics()}
+        return {"ok": False, "error": f"unknown op: {op}"}
+
+    def metrics(self):
+        """
+        Method to return a dictionary of server metrics, latencies are in milliseconds over recent requests
+        """
+        inserts = sorted(self.insert_latency)
+        queries = sorted(self.query_latency)
+        return {
+            "docs_received": self.docs_received,
+            "docs_inserted": self.docs_inserted,
+            "batches": self.batches,
+            "mean_batch": self.docs_inserted / self.batches if self.batches else 0,
+            "queries": self.queries,
+            "errors": self.errors,
+            "queue": self.queue.qsize(),
+            "max_queue": self.max_queue,
+            "insert_ms": {f"p{p}": None if percentile(inserts, p) is None else percentile(inserts, p) * 1e3 for p in (50, 95, 99)},
+            "query_ms": {f"p{p}": None if percentile(queries, p) is None else percentile(queries, p) * 1e3 for p in (50, 95, 99)},
+        }
+
+async def serve(args):
+    #Load saved data guide if input
+    guide = DataGuide.load(args.load) if args.load else DataGuide()
+    server = DataGuideServer(guide, args.batch_size, args.batch_delay, args.queue_size, args.line_limit, args.save_dir)
+    listener = await server.start(args.host, args.port, args.unix)
+    print(f"serving on {args.unix or f'{args.host}:{args.port}'}", file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a data guide over NDJSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="path of Unix socket to serve on instead of host and port")
+    parser.add_argument("--load", help="saved data guide to start from")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--batch-delay", type=float, default=0.005)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--line-limit", type=int, default=8 * 2**20, help="largest request line in bytes")
+    parser.add_argument("--save-dir", help="directory save requests write into (default current directory)")
+    asyncio.run(serve(parser.parse_args()))
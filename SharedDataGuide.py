@@ -0,0 +1,241 @@
+import json
+import hashlib
+import multiprocessing
+from array import array
+from multiprocessing.shared_memory import SharedMemory
+
+from DataGuide import DataGuide, Node, counters
+
+#Counter types with a column, any other type cannot be stored
+TYPES = list(counters()) + ["NoneType"]
+#Column of each type, document count is stored in the last column
+COLUMNS = {type_name: column for column, type_name in enumerate(TYPES)}
+DOC_COLUMN = len(TYPES)
+ROW_SIZE = len(TYPES) + 1
+#Header fields: capacity, workers, heap size, heap bytes used, slots used, then total documents of each worker
+HEADER_SIZE = 5
+#Slot fields: path hash (0 if empty), path offset in heap, path length, order slot was claimed in
+SLOT_SIZE = 4
+
+#Data guide used to classify values, so types match DataGuide exactly
+_CLASSIFIER = DataGuide()
+
+#Basic function returning a nonzero 64 bit hash of an encoded path, the same in every process
+def path_hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") >> 1 or 1
+
+class SharedDataGuide:
+    def __init__(self, capacity=65536, workers=1, heap_size=None, name=None, lock=None):
+        """
+        Initialization method for SharedDataGuide
+        -- Path table of a data guide stored in a shared memory segment, so worker processes count into one table
+        -- Holds up to capacity paths, counters of each path have one row per worker summed on read, so workers never lock counters
+        -- Paths are stored in a heap of heap_size bytes (64 bytes per path if not input)
+        -- If name is input, the existing segment is attached instead of created, lock has to be the lock of the creator
+        """
+        if name is None:
+            #Size of path heap
+            if heap_size is None:
+                heap_size = 64 * capacity
+            #Header, slot table, counter rows of every worker and path heap, in 8 byte fields
+            fields = HEADER_SIZE + workers + SLOT_SIZE * capacity + ROW_SIZE * capacity * workers
+            self.shm = SharedMemory(create=True, size=8 * fields + heap_size)
+            self.lock = lock if lock is not None else multiprocessing.Lock()
+            #Write sizes to header before mapping the rest of the segment
+            header = self.shm.buf[:8 * HEADER_SIZE].cast("q")
+            header[:] = array("q", [capacity, workers, heap_size, 0, 0])
+            header.release()
+            self._map()
+        else:
+            #Attach without tracking segment where supported, the creator unlinks it
+            #Older versions register it again with the resource tracker shared with the creator, which changes nothing
+            try:
+                self.shm = SharedMemory(name, track=False)
+            except TypeError:
+                self.shm = SharedMemory(name)
+            self.lock = lock
+            self._map()
+        #Worker whose counter rows this process writes, set in each worker process
+        self.worker = 0
+
+    def _map(self):
+        """
+        Helper method to build views of the header, slot table, counter rows and heap of the segment
+        """
+        buf = self.shm.buf
+        #Read sizes from header
+        header = buf[:8 * HEADER_SIZE].cast("q")
+        self.capacity, self.workers, self.heap_size = header[0], header[1], header[2]
+        header.release()
+        #Header fields including document totals of workers
+        end = 8 * (HEADER_SIZE + self.workers)
+        self.header = buf[:end].cast("q")
+        self.slots = buf[end:end + 8 * SLOT_SIZE * self.capacity].cast("q")
+        end += 8 * SLOT_SIZE * self.capacity
+        self.rows = buf[end:end + 8 * ROW_SIZE * self.capacity * self.workers].cast("q")
+        end += 8 * ROW_SIZE * self.capacity * self.workers
+        self.heap = buf[end:end + self.heap_size]
+        #Slot of each path seen by this process, and last document counted per slot
+        self._slot_cache = {}
+        self._last_doc = {}
+        self._next_doc = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __getstate__(self):
+        """
+        Method used when the store is passed to a worker process, only the segment name and lock are sent
+        -- The lock can only be sent to a process while it is started (Process arguments, or initargs of Pool and
+           ProcessPoolExecutor), tasks submitted to a running pool cannot carry the store
+        """
+        if multiprocessing.context.get_spawning_popen() is None:
+            raise RuntimeError("SharedDataGuide can only be sent to a process while it is started: pass it as a Process "
+                               "argument or in initargs of Pool or ProcessPoolExecutor, not as a task argument")
+        return {"name": self.shm.name, "lock": self.lock, "worker": self.worker}
+
+    def __setstate__(self, state):
+        """
+        Method used in a worker process to attach the segment of the store
+        """
+        self.__init__(name=state["name"], lock=state["lock"])
+        self.worker = state["worker"]
+
+    def _slot(self, path):
+        """
+        Helper method returning the slot of a path (tuple of keys), claiming a free slot if path is new
+        """
+        #Slots found before need no lookup
+        slot = self._slot_cache.get(path)
+        if slot is not None:
+            return slot
+        key = json.dumps(path).encode()
+        h = path_hash(key)
+        slots = self.slots
+        slot = h % self.capacity
+        #Probe slots in order until path or a free slot is found
+        for _ in range(self.capacity):
+            base = slot * SLOT_SIZE
+            stored = slots[base]
+            #Free slot, claim it while holding lock (another process may claim it first)
+            if stored == 0:
+                with self.lock:
+                    stored = slots[base]
+                    if stored == 0:
+                        self._claim(base, h, key)
+                        stored = h
+            #Slot holds path if hash and key match
+            if stored == h and bytes(self.heap[slots[base + 1]:slots[base + 1] + slots[base + 2]]) == key:
+                self._slot_cache[path] = slot
+                return slot
+            slot = (slot + 1) % self.capacity
+        raise MemoryError(f"shared data guide is full ({self.capacity} paths)")
+
+    def _claim(self, base, h, key):
+        """
+        Helper method to store a path in a free slot, called holding lock
+        """
+        used = self.header[3]
+        if used + len(key) > self.heap_size:
+            raise MemoryError(f"shared data guide path heap is full ({self.heap_size} bytes)")
+        #Write path first and hash last, so other processes never see a hash without its path
+        self.heap[used:used + len(key)] = key
+        self.header[3] = used + len(key)
+        self.slots[base + 1] = used
+        self.slots[base + 2] = len(key)
+        self.slots[base + 3] = self.header[4]
+        self.header[4] += 1
+        self.slots[base] = h
+
+    def insert_document(self, doc):
+        """
+        Method used to insert a document into the counter rows of this process's worker
+        """
+        #Iterate over documents in file, or single document
+        for d in doc if isinstance(doc, list) else [doc]:
+            #Count document for worker
+            self.header[HEADER_SIZE + self.worker] += 1
+            self._next_doc += 1
+            self._insert_value((), d, self._next_doc)
+
+    def _insert_value(self, path, value, doc_id):
+        """
+        Helper method to count a single value at path, called recursively on objects and arrays
+        """
+        slot = self._slot(path)
+        #Start of counter row of slot for worker
+        base = ((self.worker * self.capacity) + slot) * ROW_SIZE
+        rows = self.rows
+        #Count document once per path
+        if self._last_doc.get(slot) != doc_id:
+            self._last_doc[slot] = doc_id
+            rows[base + DOC_COLUMN] += 1
+        #Check if current value is a dictionary (nested JSON object)
+        if isinstance(value, dict):
+            rows[base + COLUMNS["obj"]] += 1
+            #Recursive call for children
+            for key, subvalue in value.items():
+                self._insert_value(path + (key,), subvalue, doc_id)
+        #Check if current value is a list (array)
+        elif isinstance(value, list):
+            rows[base + COLUMNS["arr"]] += 1
+            #Add * path even for empty arrays, like DataGuide
+            path = path + ("*",)
+            self._slot(path)
+            #Recursive call for array elements
+            for element in value:
+                self._insert_value(path, element, doc_id)
+        #Value is not object or array
+        else:
+            type_name = _CLASSIFIER._get_type(value)
+            if type_name not in COLUMNS:
+                raise ValueError(f"type {type_name} cannot be stored in a shared data guide")
+            rows[base + COLUMNS[type_name]] += 1
+
+    def to_guide(self):
+        """
+        Method returning a DataGuide holding the counters of every worker summed
+        """
+        guide = DataGuide()
+        guide.total_docs = sum(self.header[HEADER_SIZE:HEADER_SIZE + self.workers])
+        slots, rows = self.slots, self.rows
+        #Used slots in the order they were claimed, so parents come before children
+        used = sorted((slots[s * SLOT_SIZE + 3], s) for s in range(self.capacity) if slots[s * SLOT_SIZE])
+        for _, slot in used:
+            base = slot * SLOT_SIZE
+            path = json.loads(bytes(self.heap[slots[base + 1]:slots[base + 1] + slots[base + 2]]))
+            #Get node of path, adding keys if not already present
+            node = guide.root
+            for key in path:
+                if key not in node.children:
+                    node.children[key] = Node()
+                node = node.children[key]
+            #Sum counter rows of every worker
+            total = [0] * ROW_SIZE
+            for worker in range(self.workers):
+                row = ((worker * self.capacity) + slot) * ROW_SIZE
+                for column in range(ROW_SIZE):
+                    total[column] += rows[row + column]
+            #Types outside of the usual counters are only added if present, like in DataGuide
+            for type_name, column in COLUMNS.items():
+                if type_name in node.counters or total[column]:
+                    node.counters[type_name] = total[column]
+            node.doc_count = total[DOC_COLUMN]
+        return guide
+
+    def close(self):
+        """
+        Method to close the views of the segment in this process
+        """
+        self.header.release()
+        self.slots.release()
+        self.rows.release()
+        self.heap.release()
+        self.shm.close()
+
+    def unlink(self):
+        """
+        Method to free the segment, called once by the creating process after every worker is done
+        """
+        self.shm.unlink()
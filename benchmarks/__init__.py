@@ -0,0 +1 @@
+#Benchmarks of DataGuide, run from the repository root as modules (python -m benchmarks.suite)
@@ -0,0 +1,50 @@
+import random
+import time
+
+from DataGuide import DataGuide
+
+#Benchmark of search_many/card_many against a loop of search/card
+#Run from the repository root: python -m benchmarks.batch_lookup
+
+#Basic function to build a document with nested keys from a seeded generator
+def make_document(rng, width=6, depth=5):
+    if depth == 0:
+        return rng.choice([1, 2.5, "foo", None])
+    return {f"k{rng.randrange(width)}": make_document(rng, width, depth - 1) for _ in range(width // 2)}
+
+#Basic function to return the fastest of several timed runs
+def best_of(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(docs=3000, queries=500, seed=0):
+    rng = random.Random(seed)
+    #Build guide
+    guide = DataGuide()
+    for _ in range(docs):
+        guide.insert_document(make_document(rng))
+    #Gather every path of the guide
+    paths = [path for path, _ in guide.iter_paths()]
+    #Queries mix present paths (parents and their children) with missing paths
+    batch = [rng.choice(paths) for _ in range(queries - queries // 10)] + [f"missing.k{i}" for i in range(queries // 10)]
+    rng.shuffle(batch)
+    #Results must match
+    assert guide.search_many(batch) == [guide.search(p) for p in batch]
+    assert guide.card_many(batch) == {p: guide.card(p) for p in batch}
+    #Time each method
+    loop_search = best_of(lambda: [guide.search(p) for p in batch])
+    many_search = best_of(lambda: guide.search_many(batch))
+    loop_card = best_of(lambda: {p: guide.card(p) for p in batch})
+    many_card = best_of(lambda: guide.card_many(batch))
+    print(f"{len(paths)} paths in guide, {len(batch)} paths per batch")
+    print(f"search loop  {loop_search * 1e3:8.3f} ms")
+    print(f"search_many  {many_search * 1e3:8.3f} ms ({loop_search / many_search:.2f}x)")
+    print(f"card loop    {loop_card * 1e3:8.3f} ms")
+    print(f"card_many    {many_card * 1e3:8.3f} ms ({loop_card / many_card:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import sys
+import random
+import threading
+import time
+
+from DataGuide import DataGuide, ConcurrentDataGuide
+from benchmarks.batch_lookup import make_document
+
+#Benchmark of ConcurrentDataGuide inserts from 1-16 threads against a DataGuide behind one global lock
+#Run from the repository root: python -m benchmarks.concurrent_insert
+#Threads only run in parallel on free-threaded builds, with the GIL the sharded guide shows its locking overhead
+
+#Basic function to insert docs split over threads, returns seconds taken
+def run_threads(insert, docs, threads):
+    workers = [threading.Thread(target=lambda chunk: [insert(doc) for doc in chunk], args=(docs[i::threads],))
+               for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+def main(docs=5000, seed=0, thread_counts=(1, 2, 4, 8, 16)):
+    rng = random.Random(seed)
+    #Documents with many top-level keys so inserts spread over shards
+    batch = [make_document(rng, width=16, depth=3) for _ in range(docs)]
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"{docs} documents, GIL {'enabled' if gil else 'disabled'}")
+    print(f"{'threads':>7} {'global lock':>14} {'sharded':>14}")
+    for threads in thread_counts:
+        #DataGuide with every insert behind one lock
+        guide = DataGuide()
+        lock = threading.Lock()
+        def insert_global(doc):
+            with lock:
+                guide.insert_document(doc)
+        global_time = run_threads(insert_global, batch, threads)
+        #ConcurrentDataGuide locking only the shards of each document
+        sharded = ConcurrentDataGuide()
+        sharded_time = run_threads(sharded.insert_document, batch, threads)
+        #Both guides must hold the same counters
+        assert sharded.card() == guide.card() and sharded.total_docs == guide.total_docs
+        print(f"{threads:>7} {docs / global_time:>10.0f} d/s {docs / sharded_time:>10.0f} d/s")
+
+if __name__ == "__main__":
+    main()
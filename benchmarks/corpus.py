@@ -0,0 +1,64 @@
+import random
+
+#Seeded generators of synthetic document corpora, the same seed always gives the same documents
+
+#Values of several types, including strings the date check accepts
+SCALARS = [lambda rng: rng.randrange(1000), lambda rng: rng.random() * 100, lambda rng: f"s{rng.randrange(50)}",
+           lambda rng: f"2024-{rng.randrange(10, 13)}{rng.randrange(10, 29)}", lambda rng: None, lambda rng: rng.random() < 0.5]
+
+#Basic function to return a random scalar value
+def scalar(rng):
+    return rng.choice(SCALARS)(rng)
+
+#Basic function to build a document with many keys at the top level
+def wide_flat(rng, width=200):
+    return {f"f{i}": scalar(rng) for i in range(width) if rng.random() < 0.8}
+
+#Basic function to build a document nested many levels deep, with a few siblings per level
+def deep_nested(rng, depth=12, siblings=2):
+    doc = {f"leaf{i}": scalar(rng) for i in range(siblings)}
+    for level in reversed(range(depth)):
+        doc = {f"n{level}": doc, **{f"v{level}_{i}": scalar(rng) for i in range(rng.randrange(siblings + 1))}}
+    return doc
+
+#Basic function to build a document made mostly of arrays, of scalars, objects and nested arrays
+def array_heavy(rng, length=20):
+    return {
+        "tags": [scalar(rng) for _ in range(rng.randrange(length))],
+        "items": [{"id": rng.randrange(10 ** 6), "qty": scalar(rng), "parts": [scalar(rng) for _ in range(rng.randrange(5))]}
+                  for _ in range(rng.randrange(length))],
+        "matrix": [[rng.random() for _ in range(rng.randrange(5))] for _ in range(rng.randrange(length // 2))],
+        "empty": [],
+    }
+
+#Basic function to build a document whose keys hold a different type from one document to the next
+def heterogeneous(rng, width=20):
+    doc = {}
+    for i in range(width):
+        kind = rng.randrange(4)
+        if kind == 0:
+            doc[f"h{i}"] = scalar(rng)
+        elif kind == 1:
+            doc[f"h{i}"] = {"x": scalar(rng), "y": scalar(rng)}
+        elif kind == 2:
+            doc[f"h{i}"] = [scalar(rng) for _ in range(rng.randrange(4))]
+    return doc
+
+#Basic function to build a document keyed by ids drawn from a large space, so paths rarely repeat
+def high_cardinality(rng, keys=20, space=100000):
+    return {"users": {f"u{rng.randrange(space)}": {"score": rng.randrange(100)} for _ in range(keys)}, "kind": scalar(rng)}
+
+#Corpus name and generator
+CORPORA = {
+    "wide_flat": wide_flat,
+    "deep_nested": deep_nested,
+    "array_heavy": array_heavy,
+    "heterogeneous": heterogeneous,
+    "high_cardinality": high_cardinality,
+}
+
+#Basic function to return a list of n documents of a corpus
+def make_corpus(name, n=1000, seed=0):
+    rng = random.Random(f"{name}-{seed}")
+    generator = CORPORA[name]
+    return [generator(rng) for _ in range(n)]
@@ -0,0 +1,456 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from fnmatch import fnmatchcase
+
+from DataGuide import DataGuide, ConcurrentDataGuide
+from DataGuideServer import DataGuideServer
+from SharedDataGuide import SharedDataGuide
+from dataguide.cli import main as cli_main, read_guide
+
+#Randomized differential harness checking every optimized mode of DataGuide against a plain recursive reference
+#Run from the repository root: python -m benchmarks.equivalence [--docs 1000] [--rounds 5] [--check delete]
+#Each round generates documents mixed with the shapes of EdgeCases.json (empty and nested arrays, mixed types),
+#builds the reference and every mode, and compares counters and document counts of every path, exits with status
+#1 if any mode differs
+
+#Folder of repository, for EdgeCases.json
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+#Date check of the reference, same expression as DataGuide
+DATE = re.compile(r"\d{4}-\d{2}\d{2}")
+#Keys of generated objects, including non-ASCII keys and keys with spaces (no dots, they separate paths)
+KEYS = ["a", "b", "c", "d", "id", "name", "tags", "items", "x", "y", "clé", "k-1", "k 2", "_"]
+
+#Basic function returning a random scalar, of every type DataGuide classifies
+def make_scalar(rng):
+    return rng.choice([
+        lambda: rng.randrange(-5, 300),
+        lambda: rng.randrange(10 ** 12),
+        lambda: rng.random() * 1000,
+        lambda: float(rng.randrange(10)),
+        lambda: f"s{rng.randrange(20)}",
+        lambda: "",
+        lambda: f"{rng.randrange(1990, 2030)}-{rng.randrange(10, 13)}{rng.randrange(10, 29)}",
+        lambda: None,
+        lambda: rng.random() < 0.5,
+    ])()
+
+#Basic function returning a random value, objects and arrays nest up to depth levels
+def make_value(rng, depth):
+    r = rng.random()
+    if depth <= 0 or r < 0.45:
+        return make_scalar(rng)
+    if r < 0.7:
+        return make_object(rng, depth - 1)
+    kind = rng.randrange(5)
+    #Empty array
+    if kind == 0:
+        return []
+    #Nested arrays, some empty
+    if kind == 1:
+        return [[make_scalar(rng) for _ in range(rng.randrange(3))] for _ in range(rng.randrange(4))]
+    #Array of objects with differing keys, repeated keys in one document are counted once per document
+    if kind == 2:
+        return [make_object(rng, depth - 1) for _ in range(rng.randrange(4))]
+    #Array of mixed values
+    return [make_value(rng, depth - 1) for _ in range(rng.randrange(5))]
+
+#Basic function returning a random object with up to 6 keys, possibly empty
+def make_object(rng, depth):
+    return {rng.choice(KEYS): make_value(rng, depth) for _ in range(rng.randrange(7))}
+
+#Basic function returning n random documents mixed with the documents of EdgeCases.json
+def make_documents(rng, n, depth=4):
+    with open(os.path.join(ROOT, "EdgeCases.json")) as f:
+        edge_cases = json.load(f)
+    docs = [make_object(rng, depth) for _ in range(n)] + edge_cases * max(1, n // 100)
+    rng.shuffle(docs)
+    return docs
+
+#Basic function returning the type name the reference gives a value, booleans count as int like in DataGuide
+def reference_type(value):
+    if isinstance(value, dict):
+        return "obj"
+    if isinstance(value, list):
+        return "arr"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "date" if DATE.match(value) else "str"
+    return type(value).__name__
+
+#Basic function to insert a value into a reference node, reached holds the nodes already counted for the document
+def reference_insert(node, value, reached):
+    if id(node) not in reached:
+        reached.add(id(node))
+        node["doc_count"] += 1
+    type_name = reference_type(value)
+    node["counters"][type_name] = node["counters"].get(type_name, 0) + 1
+    if isinstance(value, dict):
+        for key, subvalue in value.items():
+            reference_insert(node["children"].setdefault(key, {"counters": {}, "doc_count": 0, "children": {}}), subvalue, reached)
+    elif isinstance(value, list):
+        #Arrays always have a * child, even when empty
+        child = node["children"].setdefault("*", {"counters": {}, "doc_count": 0, "children": {}})
+        for element in value:
+            reference_insert(child, element, reached)
+
+#Basic function returning the canonical form of the reference guide of docs
+def reference(docs):
+    root = {"counters": {}, "doc_count": 0, "children": {}}
+    for doc in docs:
+        reference_insert(root, doc, set())
+    paths = {}
+    stack = [((), root)]
+    while stack:
+        path, node = stack.pop()
+        paths[path] = ({t: c for t, c in node["counters"].items() if c}, node["doc_count"])
+        stack.extend((path + (key,), child) for key, child in node["children"].items())
+    return {"total_docs": len(docs), "paths": paths}
+
+#Basic function returning the canonical form of a data guide, {path tuple: (nonzero counters, doc count)}
+def canonical(guide):
+    paths = {}
+    stack = [((), guide.root)]
+    while stack:
+        path, node = stack.pop()
+        paths[path] = ({t: c for t, c in node.counters.items() if c}, node.doc_count)
+        stack.extend((path + (key,), child) for key, child in node.children.items())
+    return {"total_docs": guide.total_docs, "paths": paths}
+
+#Basic function returning the first difference of two canonical forms, None if equal
+def compare(expected, actual):
+    if expected["total_docs"] != actual["total_docs"]:
+        return f"total_docs {actual['total_docs']} != {expected['total_docs']}"
+    for path in sorted(expected["paths"].keys() | actual["paths"].keys()):
+        name = ".".join(path) or "root"
+        if path not in actual["paths"]:
+            return f"{name} missing"
+        if path not in expected["paths"]:
+            return f"{name} not expected"
+        if expected["paths"][path] != actual["paths"][path]:
+            return f"{name} {actual['paths'][path]} != {expected['paths'][path]}"
+    return None
+
+#Basic function returning the reference with only the paths a projection keeps (matches, their subtrees and ancestors)
+def project_reference(expected, patterns):
+    patterns = [tuple(pattern.split('.')) for pattern in patterns]
+    keep = lambda path: any(all(fnmatchcase(key, segment) for key, segment in zip(path, pattern)) for pattern in patterns)
+    return {"total_docs": expected["total_docs"], "paths": {p: v for p, v in expected["paths"].items() if keep(p)}}
+
+#Basic function returning random projection patterns built from paths of the reference, some with wildcards
+def make_patterns(rng, expected):
+    paths = [path for path in expected["paths"] if path]
+    patterns = []
+    for path in rng.sample(paths, min(len(paths), rng.randrange(1, 4))):
+        path = list(path[:rng.randrange(1, len(path) + 1)])
+        if rng.random() < 0.3:
+            path[rng.randrange(len(path))] = "*"
+        patterns.append(".".join(path))
+    return patterns
+
+#Basic function to build a data guide of docs
+def build(docs, **options):
+    guide = DataGuide(**options)
+    for doc in docs:
+        guide.insert_document(doc)
+    return guide
+
+#Checks, each takes (docs, expected, rng) and returns a list of (label, expected, canonical form) to compare
+
+def check_insert(docs, expected, rng):
+    return [("insert", expected, canonical(build(docs)))]
+
+def check_batch(docs, expected, rng):
+    guide = DataGuide()
+    guide.insert_document(docs)
+    return [("batch", expected, canonical(guide))]
+
+def check_insert_json(docs, expected, rng):
+    guide = DataGuide()
+    guide.insert_json([json.dumps(doc) for doc in docs])
+    return [("insert_json", expected, canonical(guide))]
+
+def check_options(docs, expected, rng):
+    #Sketches, document ids, co-occurrence and instrumentation must not change counters
+    guide = build(docs, value_stats=True, distinct=True, top_k=4, doc_ids=True, cooccurrence=8,
+                  cooccurrence_warmup=len(docs) // 4, instrument=True)
+    return [("options", expected, canonical(guide))]
+
+def check_save_load(docs, expected, rng):
+    guide = build(docs, value_stats=True, doc_ids=True)
+    loaded = DataGuide.from_dict(json.loads(json.dumps(guide.to_dict())))
+    return [("save_load", expected, canonical(loaded))]
+
+def check_union(docs, expected, rng):
+    #Union of three parts cut at random points
+    cuts = sorted(rng.sample(range(len(docs) + 1), 2))
+    parts = [docs[:cuts[0]], docs[cuts[0]:cuts[1]], docs[cuts[1]:]]
+    guide = build(parts[0], doc_ids=True).union(build(parts[1], doc_ids=True)).union(build(parts[2], doc_ids=True))
+    return [("union", expected, canonical(guide))]
+
+def check_delete(docs, expected, rng):
+    #Delete a random third of the documents, in one batch, one at a time and by document id
+    deleted = set(rng.sample(range(len(docs)), len(docs) // 3))
+    kept = reference([doc for i, doc in enumerate(docs) if i not in deleted])
+    batch = build(docs)
+    batch.delete_many([docs[i] for i in sorted(deleted)])
+    single = build(docs)
+    for i in sorted(deleted):
+        single.delete_document(docs[i])
+    ids = build(docs, doc_ids=True)
+    ids.delete_many([docs[i] for i in sorted(deleted)], sorted(deleted))
+    single_ids = build(docs, doc_ids=True)
+    for i in sorted(deleted):
+        single_ids.delete_document(docs[i], i)
+    return [("delete_many", kept, canonical(batch)), ("delete_document", kept, canonical(single)),
+            ("delete_ids", kept, canonical(ids)), ("delete_document_ids", kept, canonical(single_ids))]
+
+def check_snapshot(docs, expected, rng):
+    #Snapshot after half of the documents must not see later inserts and deletes
+    half = len(docs) // 2
+    guide = build(docs[:half])
+    view = guide.snapshot()
+    for doc in docs[half:]:
+        guide.insert_document(doc)
+    guide.delete_many(docs[:half // 2])
+    return [("snapshot_view", reference(docs[:half]), canonical(view)),
+            ("snapshot_guide", reference(docs[half // 2:]), canonical(guide))]
+
+def check_projection(docs, expected, rng):
+    patterns = make_patterns(rng, expected)
+    projected = project_reference(expected, patterns)
+    return [(f"projection {patterns}", projected, canonical(build(docs, projection=patterns))),
+            (f"project {patterns}", projected, canonical(build(docs).project(patterns)))]
+
+#Basic function to insert docs into a data guide from several threads
+def insert_threads(guide, docs, threads=4):
+    workers = [threading.Thread(target=lambda chunk: [guide.insert_document(doc) for doc in chunk], args=(docs[i::threads],))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return guide
+
+#Basic function filling a concurrent data guide from threads while other threads keep running every read that walks it
+def read_while_inserting(guide, docs, other, readers=2):
+    errors = []
+    done = threading.Event()
+    def read():
+        try:
+            while not done.is_set():
+                for _ in guide.iter_paths():
+                    pass
+                guide.union(other)
+                guide.union(guide)
+                guide.intersect(other)
+                guide.difference(other)
+                list(guide.diff(other))
+                guide.project(["*"])
+                guide.decayed_counters()
+                for path in guide.cooccurrence_paths[:1]:
+                    guide.cooccurs_with(path)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    insert_threads(guide, docs)
+    done.set()
+    for thread in threads:
+        thread.join()
+    #Raise first error of a reader, reported as a failure of the check
+    if errors:
+        raise errors[0]
+    return guide
+
+def check_concurrent(docs, expected, rng):
+    patterns = make_patterns(rng, expected)
+    #Reads of the whole data guide while it is filled must neither fail nor change what is inserted
+    other = build(docs[:len(docs) // 10])
+    reads = ConcurrentDataGuide(shards=8, cooccurrence=16, cooccurrence_warmup=len(docs) // 4)
+    return [("concurrent", expected, canonical(insert_threads(ConcurrentDataGuide(shards=8), docs))),
+            (f"concurrent_projection {patterns}", project_reference(expected, patterns),
+             canonical(insert_threads(ConcurrentDataGuide(shards=8, projection=patterns), docs))),
+            ("concurrent_reads", expected, canonical(read_while_inserting(reads, docs, other)))]
+
+#Basic function returning (capacity, heap size) a shared data guide needs for the paths of a reference
+def shared_size(expected):
+    return 2 * len(expected["paths"]) + 64, 2 * sum(len(json.dumps(list(path))) for path in expected["paths"]) + 1024
+
+def check_shared(docs, expected, rng):
+    #Two workers written from this process, each document goes to one of them
+    capacity, heap_size = shared_size(expected)
+    store = SharedDataGuide(capacity, workers=2, heap_size=heap_size)
+    try:
+        for doc in docs:
+            store.worker = rng.randrange(2)
+            store.insert_document(doc)
+        guide = store.to_guide()
+    finally:
+        store.close()
+        store.unlink()
+    return [("shared", expected, canonical(guide))]
+
+#Basic function run in worker processes of check_shared_processes
+def _shared_worker(store, worker, docs):
+    store.worker = worker
+    store.insert_document(docs)
+    store.close()
+
+def check_shared_processes(docs, expected, rng, workers=2):
+    capacity, heap_size = shared_size(expected)
+    store = SharedDataGuide(capacity, workers=workers, heap_size=heap_size)
+    try:
+        processes = [multiprocessing.Process(target=_shared_worker, args=(store, i, docs[i::workers])) for i in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        guide = store.to_guide()
+    finally:
+        store.close()
+        store.unlink()
+    return [("shared_processes", expected, canonical(guide))]
+
+def check_server(docs, expected, rng):
+    async def run():
+        server = DataGuideServer(batch_size=rng.randrange(1, 200), line_limit=2**16, save_dir=folder)
+        listener = await server.start("127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+        #Insert requests of random sizes, then a query answered once every insert is applied
+        requests = 0
+        i = 0
+        while i < len(docs):
+            size = rng.randrange(1, 50)
+            writer.write(json.dumps({"op": "insert", "docs": docs[i:i + size]}).encode() + b"\n")
+            i += size
+            requests += 1
+            #Line longer than line_limit in the middle of the inserts is answered with an error and not inserted,
+            #as is a save leaving the save directory
+            if requests == 1:
+                writer.write(json.dumps({"op": "insert", "doc": {"too_long": "x" * 2**17}}).encode() + b"\n")
+                writer.write(json.dumps({"op": "save", "filename": "../outside.json"}).encode() + b"\n")
+        writer.write(b'{"op": "metrics"}\n')
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in range(requests + 3)]
+        if responses[1]["ok"]:
+            raise AssertionError("line longer than line_limit was accepted")
+        if responses[2]["ok"] or os.path.exists(os.path.join(folder, "..", "outside.json")):
+            raise AssertionError("save outside save_dir was accepted")
+        #Wait for server to close the connection, so its handler is done before the loop stops
+        writer.write_eof()
+        await reader.read()
+        writer.close()
+        await server.close()
+        listener.close()
+        await listener.wait_closed()
+        return server.guide
+    with tempfile.TemporaryDirectory() as folder:
+        return [("server", expected, canonical(asyncio.run(run())))]
+
+def check_cli(docs, expected, rng):
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, "docs.ndjson.gz")
+        output = os.path.join(folder, "guide.json")
+        with gzip.open(filename, "wt") as f:
+            for doc in docs:
+                f.write(json.dumps(doc) + "\n")
+        cli_main(["ingest", filename, "-o", output, "--workers", "2", "--chunk-size", str(max(1, len(docs) // 7)), "-q"])
+        return [("cli", expected, canonical(read_guide(output)))]
+
+def check_queries(docs, expected, rng):
+    #card and card_many must equal the counters of the reference summed over each subtree, search and search_many
+    #must find every path
+    guide = build(docs)
+    sample = rng.sample([path for path in expected["paths"] if path], min(len(expected["paths"]) - 1, 50))
+    dotted = [".".join(path) for path in sample]
+    sums = {}
+    for path in sample:
+        total = {}
+        for other, (counts, _) in expected["paths"].items():
+            if other[:len(path)] == path:
+                for t, c in counts.items():
+                    total[t] = total.get(t, 0) + c
+        sums[path] = (total, 0)
+    #Queries are compared in the canonical form, with no document counts
+    form = lambda values: {"total_docs": 0, "paths": {path: (({t: c for t, c in value.items() if c}, 0)
+                                                             if isinstance(value, dict) else value)
+                                                      for path, value in zip(sample, values)}}
+    many = guide.card_many(dotted)
+    return [("card", form(sums.values()), form([guide.card(path) for path in dotted])),
+            ("card_many", form(sums.values()), form([many[path] for path in dotted])),
+            ("search", form([True] * len(sample)), form([guide.search(path) for path in dotted])),
+            ("search_many", form([True] * len(sample)), form(guide.search_many(dotted)))]
+
+#Check name and function, in the order they are run
+CHECKS = {
+    "insert": check_insert,
+    "batch": check_batch,
+    "insert_json": check_insert_json,
+    "options": check_options,
+    "save_load": check_save_load,
+    "union": check_union,
+    "delete": check_delete,
+    "snapshot": check_snapshot,
+    "projection": check_projection,
+    "concurrent": check_concurrent,
+    "shared": check_shared,
+    "shared_processes": check_shared_processes,
+    "server": check_server,
+    "cli": check_cli,
+    "queries": check_queries,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check every optimized DataGuide mode against a reference implementation")
+    parser.add_argument("--docs", type=int, default=1000, help="generated documents per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--depth", type=int, default=4, help="nesting depth of generated documents")
+    parser.add_argument("--check", action="append", choices=list(CHECKS), help="check to run (default all)")
+    args = parser.parse_args(argv)
+    checks = args.check or list(CHECKS)
+    failures = 0
+    comparisons = 0
+    #Seconds taken per check
+    seconds = dict.fromkeys(checks, 0.0)
+    for round_number in range(args.rounds):
+        rng = random.Random(f"equivalence-{args.seed}-{round_number}")
+        docs = make_documents(rng, args.docs, args.depth)
+        expected = reference(docs)
+        for name in checks:
+            start = time.perf_counter()
+            try:
+                results = CHECKS[name](docs, expected, rng)
+            except Exception as e:
+                results = [(name, None, f"{type(e).__name__}: {e}")]
+            seconds[name] += time.perf_counter() - start
+            for label, wanted, actual in results:
+                comparisons += 1
+                #Failed checks return the error instead of a canonical form
+                difference = actual if isinstance(actual, str) else compare(wanted, actual)
+                if difference is not None:
+                    failures += 1
+                    print(f"FAIL round {round_number} {label}: {difference}")
+    print(f"{args.rounds} rounds of {args.docs} documents")
+    for name in checks:
+        print(f"  {name:<17} {seconds[name]:>8.2f}s")
+    print(f"{comparisons} comparisons, {failures} failures")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
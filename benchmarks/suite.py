@@ -0,0 +1,183 @@
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from DataGuide import DataGuide
+from benchmarks.corpus import CORPORA, make_corpus
+
+#Benchmark suite timing DataGuide operations on synthetic corpora
+#Run from the repository root: python -m benchmarks.suite [--docs 2000] [--corpus wide_flat] [--json results.json]
+#Each scenario takes a data guide class and documents and returns (units, latencies), units are the documents
+#(or queries) processed and latencies the seconds taken by each timed call, setup is not timed
+
+#Basic function to build a data guide of docs
+def build(cls, docs):
+    guide = cls()
+    for doc in docs:
+        guide.insert_document(doc)
+    return guide
+
+#Basic function to time calls of func, returns list of seconds per call
+def timed(func, calls):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+#Basic function to gather every path of a data guide, works with every version
+def gather_paths(guide):
+    paths = []
+    stack = [("", guide.root)]
+    while stack:
+        prefix, node = stack.pop()
+        for key, child in node.children.items():
+            path = key if not prefix else prefix + "." + key
+            paths.append(path)
+            stack.append((path, child))
+    return paths
+
+def insert(cls, docs):
+    guide = cls()
+    latencies = []
+    for doc in docs:
+        start = time.perf_counter()
+        guide.insert_document(doc)
+        latencies.append(time.perf_counter() - start)
+    return len(docs), latencies
+
+def delete(cls, docs):
+    guide = build(cls, docs)
+    latencies = []
+    for doc in docs:
+        start = time.perf_counter()
+        guide.delete_document(doc)
+        latencies.append(time.perf_counter() - start)
+    return len(docs), latencies
+
+def save_load(cls, docs, calls=3):
+    guide = build(cls, docs)
+    fd, filename = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        latencies = timed(lambda: guide.save(filename), calls) + timed(lambda: cls.load(filename), calls)
+    finally:
+        os.remove(filename)
+    return len(docs) * 2 * calls, latencies
+
+def card(cls, docs):
+    guide = build(cls, docs)
+    paths = gather_paths(guide)
+    latencies = []
+    for path in paths:
+        start = time.perf_counter()
+        guide.card(path)
+        latencies.append(time.perf_counter() - start)
+    return len(paths), latencies
+
+def core(cls, docs, calls=5):
+    guide = build(cls, docs)
+    return len(docs) * calls, timed(guide.core, calls)
+
+#Basic function to build data guides of both halves of docs, so set operations have overlapping guides
+def halves(cls, docs):
+    return build(cls, docs[::2]), build(cls, docs[1::2])
+
+def union(cls, docs, calls=5):
+    first, second = halves(cls, docs)
+    return len(docs) * calls, timed(lambda: first.union(second), calls)
+
+def intersect(cls, docs, calls=5):
+    first, second = halves(cls, docs)
+    return len(docs) * calls, timed(lambda: first.intersect(second), calls)
+
+def difference(cls, docs, calls=5):
+    first, second = halves(cls, docs)
+    return len(docs) * calls, timed(lambda: first.difference(second), calls)
+
+#Scenario name, function and data guide methods it needs
+SCENARIOS = {
+    "insert": (insert, ["insert_document"]),
+    "delete": (delete, ["insert_document", "delete_document"]),
+    "save_load": (save_load, ["insert_document", "save", "load"]),
+    "card": (card, ["insert_document", "card"]),
+    "core": (core, ["insert_document", "core"]),
+    "union": (union, ["insert_document", "union"]),
+    "intersect": (intersect, ["insert_document", "intersect"]),
+    "difference": (difference, ["insert_document", "difference"]),
+}
+
+#Basic function to return the pth percentile of a list of seconds in milliseconds
+def percentile_ms(latencies, p):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1e3 if ordered else 0.0
+
+#Basic function to run one scenario, returns result dictionary or None if the class lacks a needed method
+def run_scenario(cls, name, docs, memory=True):
+    func, methods = SCENARIOS[name]
+    if not all(hasattr(cls, method) for method in methods):
+        return None
+    #Timed run
+    gc.collect()
+    units, latencies = func(cls, docs)
+    total = sum(latencies)
+    result = {
+        "units_per_s": units / total if total else 0.0,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+        "total_s": total,
+    }
+    #Second run traced for peak memory, tracing slows code down so it is not timed
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        func(cls, docs)
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result
+
+#Basic function to run scenarios on corpora, returns {corpus: {scenario: result}}
+def run_suite(cls=DataGuide, corpora=None, scenarios=None, docs=2000, seed=0, memory=True, log=None):
+    results = {}
+    for corpus in corpora or CORPORA:
+        batch = make_corpus(corpus, docs, seed)
+        results[corpus] = {}
+        for name in scenarios or SCENARIOS:
+            result = run_scenario(cls, name, batch, memory)
+            if result is None:
+                continue
+            results[corpus][name] = result
+            if log:
+                log(corpus, name, result)
+    return results
+
+#Basic function to print one result as a table row
+def print_row(corpus, name, result):
+    peak = f"{result['peak_mb']:9.1f}" if "peak_mb" in result else f"{'-':>9}"
+    print(f"{corpus:<17} {name:<11} {result['units_per_s']:>12.0f} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} "
+          f"{result['p99_ms']:>9.3f} {peak}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time DataGuide operations on synthetic corpora")
+    parser.add_argument("--docs", type=int, default=2000, help="documents per corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", action="append", choices=list(CORPORA), help="corpus to run (default all)")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="scenario to run (default all)")
+    parser.add_argument("--no-memory", action="store_true", help="skip traced run measuring peak memory")
+    parser.add_argument("--json", help="file to write results to")
+    args = parser.parse_args(argv)
+    print(f"{'corpus':<17} {'scenario':<11} {'units/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak MB':>9}")
+    results = run_suite(DataGuide, args.corpus, args.scenario, args.docs, args.seed, not args.no_memory, print_row)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": sys.version.split()[0], "docs": args.docs, "seed": args.seed, "results": results}, f, indent=4)
+
+if __name__ == "__main__":
+    main()
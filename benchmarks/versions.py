@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import argparse
+import importlib.util
+
+from benchmarks.suite import SCENARIOS, run_scenario
+from benchmarks.corpus import CORPORA, make_corpus
+
+#Harness running the benchmark suite against every importable version in PreviousBuilds and the current DataGuide.py
+#Run from the repository root: python -m benchmarks.versions [--docs 1000] [--baseline old.json] [--output results.json]
+#Versions are compared in order (each against the version before it that ran the same scenario), and against the same
+#version in a baseline results file if one is input, a drop in units per second beyond the threshold is a regression
+
+#Folder holding earlier versions, and file of current version
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREVIOUS = os.path.join(ROOT, "PreviousBuilds")
+CURRENT = os.path.join(ROOT, "DataGuide.py")
+
+#Basic function to return (name, file) of every version, oldest first and current version last
+def version_files():
+    files = [f for f in os.listdir(PREVIOUS) if f.startswith("DataGuide_v") and f.endswith(".py")]
+    files.sort(key=lambda f: int(f[len("DataGuide_v"):-3]))
+    return [(f[len("DataGuide_"):-3], os.path.join(PREVIOUS, f)) for f in files] + [("current", CURRENT)]
+
+#Basic function to import the DataGuide class of a version, returns (class, None) or (None, reason)
+def load_version(name, filename):
+    try:
+        spec = importlib.util.spec_from_file_location(f"dataguide_{name}", filename)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except Exception as e:
+        return None, f"import failed: {type(e).__name__}: {e}"
+    cls = getattr(module, "DataGuide", None)
+    if cls is None:
+        return None, "no DataGuide class"
+    if not hasattr(cls, "insert_document"):
+        return None, "no insert_document"
+    return cls, None
+
+#Basic function to run every scenario of a version, keeping the fastest of repeat runs
+def run_version(cls, corpora, scenarios, docs, seed, repeat, memory):
+    results = {}
+    for corpus in corpora:
+        batch = make_corpus(corpus, docs, seed)
+        results[corpus] = {}
+        for name in scenarios:
+            best = None
+            for i in range(repeat):
+                #Old versions may fail on some documents, record the error instead of stopping
+                try:
+                    result = run_scenario(cls, name, batch, memory and i == 0)
+                except Exception as e:
+                    result = {"error": f"{type(e).__name__}: {e}"}
+                if result is None or "error" in result:
+                    best = result
+                    break
+                if best is None or result["units_per_s"] > best["units_per_s"]:
+                    #Keep peak memory of traced run
+                    if best is not None and "peak_mb" in best:
+                        result["peak_mb"] = best["peak_mb"]
+                    best = result
+            if best is not None:
+                results[corpus][name] = best
+    return results
+
+#Basic function to return regressions of results, list of (version, corpus, scenario, reference, old, new, change)
+def find_regressions(versions, threshold, baseline=None):
+    regressions = []
+    #Latest result of each corpus and scenario among earlier versions
+    previous = {}
+    for version, entry in versions.items():
+        for corpus, scenarios in entry.get("results", {}).items():
+            for name, result in scenarios.items():
+                if "units_per_s" not in result:
+                    continue
+                new = result["units_per_s"]
+                #Compare with earlier version
+                if (corpus, name) in previous:
+                    old_version, old = previous[(corpus, name)]
+                    if new < old * (1 - threshold):
+                        regressions.append((version, corpus, name, old_version, old, new, new / old - 1))
+                previous[(corpus, name)] = (version, new)
+                #Compare with same version in baseline
+                old_result = (baseline or {}).get(version, {}).get("results", {}).get(corpus, {}).get(name, {})
+                if "units_per_s" in old_result:
+                    old = old_result["units_per_s"]
+                    if new < old * (1 - threshold):
+                        regressions.append((version, corpus, name, "baseline", old, new, new / old - 1))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every DataGuide version and flag regressions")
+    parser.add_argument("--docs", type=int, default=1000, help="documents per corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the fastest is kept")
+    parser.add_argument("--corpus", action="append", choices=list(CORPORA), help="corpus to run (default all)")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="scenario to run (default all)")
+    parser.add_argument("--version", action="append", help="version to run, e.g. v7 or current (default all)")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown counted as a regression (0.1 is 10%%)")
+    parser.add_argument("--baseline", help="earlier results file to compare each version with")
+    parser.add_argument("--output", default="version_results.json", help="file to write results to")
+    parser.add_argument("--memory", action="store_true", help="also measure peak memory (slower)")
+    parser.add_argument("--fail", action="store_true", help="exit with status 1 if any regression is found")
+    args = parser.parse_args(argv)
+    corpora = args.corpus or list(CORPORA)
+    scenarios = args.scenario or list(SCENARIOS)
+    #Run every version
+    versions = {}
+    for name, filename in version_files():
+        if args.version and name not in args.version:
+            continue
+        cls, reason = load_version(name, filename)
+        if cls is None:
+            print(f"{name:<8} skipped ({reason})")
+            versions[name] = {"skipped": reason}
+            continue
+        start = time.perf_counter()
+        results = run_version(cls, corpora, scenarios, args.docs, args.seed, args.repeat, args.memory)
+        versions[name] = {"results": results}
+        ran = sum(len(s) for s in results.values())
+        print(f"{name:<8} {ran} scenarios in {time.perf_counter() - start:.1f}s")
+    #Print units per second of every scenario, one column per version
+    names = [name for name in versions if "results" in versions[name]]
+    print(f"\n{'corpus':<17} {'scenario':<11}" + "".join(f"{name:>12}" for name in names))
+    for corpus in corpora:
+        for scenario in scenarios:
+            cells = []
+            for name in names:
+                result = versions[name]["results"][corpus].get(scenario)
+                cells.append("-" if result is None else "error" if "error" in result else f"{result['units_per_s']:.0f}")
+            print(f"{corpus:<17} {scenario:<11}" + "".join(f"{cell:>12}" for cell in cells))
+    #Flag regressions
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["versions"]
+    regressions = find_regressions(versions, args.threshold, baseline)
+    print(f"\n{len(regressions)} regressions beyond {args.threshold:.0%}")
+    for version, corpus, scenario, reference, old, new, change in regressions:
+        print(f"  {version} {corpus} {scenario}: {new:.0f}/s vs {old:.0f}/s in {reference} ({change:+.0%})")
+    #Store results
+    with open(args.output, "w") as f:
+        json.dump({"python": sys.version.split()[0], "docs": args.docs, "seed": args.seed, "repeat": args.repeat,
+                   "threshold": args.threshold, "versions": versions,
+                   "regressions": [dict(zip(["version", "corpus", "scenario", "reference", "old", "new", "change"], r))
+                                   for r in regressions]}, f, indent=4)
+    print(f"results written to {args.output}")
+    if args.fail and regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+#Command-line interface of the data guide, run from the repository root: python -m dataguide <command> --help
+from dataguide.cli import main
@@ -0,0 +1,5 @@
+import sys
+
+from dataguide.cli import main
+
+sys.exit(main())
@@ -0,0 +1,364 @@
+import os
+import sys
+import bz2
+import gzip
+import json
+import lzma
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from DataGuide import DataGuide
+
+#Command-line interface for bulk data guide jobs, run from the repository root: python -m dataguide <command> --help
+#Inputs are files or directories of NDJSON (one document per line) or JSON (one document or array per file),
+#optionally compressed with gzip (.gz), bzip2 (.bz2) or xz (.xz), - reads standard input
+
+#Opener of each compressed file extension
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open, ".lzma": lzma.open}
+#Extensions of document files picked up when walking directories
+EXTENSIONS = (".json", ".ndjson", ".jsonl")
+
+#Basic function to open a file for reading or writing, decompressing or compressing by extension, - is stdin/stdout
+def open_file(filename, mode="rb"):
+    if filename == "-":
+        stream = sys.stdin if "r" in mode else sys.stdout
+        return stream.buffer if "b" in mode else stream
+    opener = OPENERS.get(os.path.splitext(filename)[1].lower(), open)
+    #Compressed files are opened as text by adding t to the mode
+    if opener is not open and "b" not in mode:
+        mode += "t"
+    return opener(filename, mode)
+
+#Basic function to return the file name without compression extension
+def base_name(filename):
+    root, ext = os.path.splitext(filename)
+    return root if ext.lower() in OPENERS else filename
+
+#Basic function to expand inputs into files, directories are walked in sorted order for document files
+def expand_inputs(inputs):
+    files = []
+    for name in inputs:
+        if os.path.isdir(name):
+            for folder, dirs, filenames in os.walk(name):
+                dirs.sort()
+                for filename in sorted(filenames):
+                    if base_name(filename).lower().endswith(EXTENSIONS):
+                        files.append(os.path.join(folder, filename))
+        else:
+            files.append(name)
+    return files
+
+#Basic function to load a saved data guide, compressed or not
+def read_guide(filename):
+    with open_file(filename, "r") as f:
+        return DataGuide.from_dict(json.load(f))
+
+#Basic function to write a saved data guide, compressed by extension
+def write_guide(guide, filename):
+    with open_file(filename, "w") as f:
+        json.dump(guide.to_dict(), f, indent=4)
+        f.write("\n")
+
+#Basic function to parse lines of NDJSON, returns (documents, errors), invalid lines raise unless skip_errors
+def parse_lines(lines, skip_errors=False):
+    docs = []
+    errors = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            doc = json.loads(line)
+        except ValueError:
+            if not skip_errors:
+                raise
+            errors += 1
+            continue
+        #A line holding an array holds several documents
+        if isinstance(doc, list):
+            docs.extend(doc)
+        else:
+            docs.append(doc)
+    return docs, errors
+
+#Basic function to split an input file into work items, (filename, "lines", lines) chunks of NDJSON or
+#(filename, "json", text) for JSON
+#A file is NDJSON if its first line is a whole JSON object, otherwise it is read as one JSON value
+def read_items(filename, chunk_size):
+    with open_file(filename, "rb") as f:
+        #Skip leading empty lines
+        first = f.readline()
+        while first and not first.strip():
+            first = f.readline()
+        #Empty file has no documents
+        if not first:
+            return
+        try:
+            ndjson = isinstance(json.loads(first), dict)
+        except ValueError:
+            ndjson = False
+        if not ndjson:
+            yield filename, "json", first + f.read()
+            return
+        chunk = [first]
+        for line in f:
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield filename, "lines", chunk
+                chunk = []
+        if chunk:
+            yield filename, "lines", chunk
+
+#Basic function to return (documents, errors) of a work item, parse errors name the file
+def parse_item(item, skip_errors=False):
+    filename, kind, data = item
+    try:
+        if kind == "lines":
+            return parse_lines(data, skip_errors)
+        doc = json.loads(data)
+    except ValueError as e:
+        raise ValueError(f"{filename}: {e}") from None
+    return (doc if isinstance(doc, list) else [doc]), 0
+
+#Basic function to return the bytes of a work item
+def item_bytes(item):
+    _, kind, data = item
+    return sum(len(line) for line in data) if kind == "lines" else len(data)
+
+#Data guide options and error handling of worker processes, set once per process
+_WORKER = {}
+
+def _init_worker(options, skip_errors):
+    _WORKER["options"] = options
+    _WORKER["skip_errors"] = skip_errors
+
+#Basic function run in worker processes, returns (data guide of item, documents, errors)
+def _ingest_item(item):
+    docs, errors = parse_item(item, _WORKER["skip_errors"])
+    guide = DataGuide(**_WORKER["options"])
+    guide.insert_document(docs)
+    return guide, len(docs), errors
+
+class Progress:
+    def __init__(self, stream=sys.stderr, interval=0.5, enabled=True):
+        """
+        Initialization method for Progress
+        -- Meter of documents and bytes processed and their throughput, redrawn at most every interval seconds
+        -- Only drawn when enabled and stream is a terminal, the summary is always written when enabled
+        """
+        self.stream = stream
+        self.interval = interval
+        self.enabled = enabled
+        self.live = enabled and stream.isatty()
+        self.start = time.perf_counter()
+        self.last = 0.0
+        self.docs = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def line(self):
+        """
+        Method returning the meter as one line
+        """
+        elapsed = time.perf_counter() - self.start
+        rate = self.docs / elapsed if elapsed else 0.0
+        mb = self.bytes / 2 ** 20
+        line = f"{self.docs:,} docs  {mb:,.1f} MB  {rate:,.0f} docs/s  {mb / elapsed if elapsed else 0.0:,.1f} MB/s  {elapsed:.1f}s"
+        if self.errors:
+            line += f"  {self.errors:,} skipped"
+        return line
+
+    def update(self, docs=0, nbytes=0, errors=0):
+        """
+        Method to add processed documents, bytes and skipped lines, redrawing the meter if interval has passed
+        """
+        self.docs += docs
+        self.bytes += nbytes
+        self.errors += errors
+        now = time.perf_counter()
+        if self.live and now - self.last >= self.interval:
+            self.last = now
+            self.stream.write("\r" + self.line())
+            self.stream.flush()
+
+    def finish(self, message=""):
+        """
+        Method to write the final meter line followed by message
+        """
+        if self.enabled:
+            self.stream.write(("\r" if self.live else "") + self.line() + (f"  {message}" if message else "") + "\n")
+            self.stream.flush()
+
+#Basic function to return data guide options of ingest arguments
+def guide_options(args):
+    options = {}
+    if args.value_stats:
+        options["value_stats"] = True
+    if args.distinct:
+        options["distinct"] = True
+    if args.top_k:
+        options["top_k"] = args.top_k
+    if args.projection:
+        options["projection"] = args.projection
+    return options
+
+def ingest(args):
+    options = guide_options(args)
+    progress = Progress(enabled=not args.quiet)
+    files = expand_inputs(args.inputs)
+    #Work items of every file, read lazily
+    items = (item for filename in files for item in read_items(filename, args.chunk_size))
+    if args.workers <= 1:
+        guide = DataGuide(**options)
+        for item in items:
+            docs, errors = parse_item(item, args.skip_errors)
+            guide.insert_document(docs)
+            progress.update(len(docs), item_bytes(item), errors)
+    else:
+        #Each worker builds a data guide of an item, which are merged in submission order so output is deterministic
+        guide = None
+        pending = deque()
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(options, args.skip_errors)) as pool:
+            #Limit items waiting, so input is not read faster than workers insert it
+            for item in items:
+                pending.append((pool.submit(_ingest_item, item), item_bytes(item)))
+                if len(pending) >= 2 * args.workers:
+                    guide = merge_result(guide, pending.popleft(), progress)
+            while pending:
+                guide = merge_result(guide, pending.popleft(), progress)
+        if guide is None:
+            guide = DataGuide(**options)
+    #Continue from an earlier saved data guide
+    if args.base:
+        guide = read_guide(args.base).union(guide)
+    write_guide(guide, args.output)
+    progress.finish(f"{len(files)} files -> {args.output}")
+
+#Basic function to wait for a worker result and union it into guide, returns the union
+def merge_result(guide, entry, progress):
+    future, nbytes = entry
+    result, docs, errors = future.result()
+    progress.update(docs, nbytes, errors)
+    return result if guide is None else guide.union(result)
+
+def merge(args):
+    progress = Progress(enabled=not args.quiet)
+    files = expand_inputs(args.guides)
+    guide = None
+    for filename in files:
+        other = read_guide(filename)
+        guide = other if guide is None else guide.union(other)
+        progress.update(other.total_docs, os.path.getsize(filename))
+    write_guide(guide if guide is not None else DataGuide(), args.output)
+    progress.finish(f"{len(files)} guides -> {args.output}")
+
+def diff(args):
+    old, new = read_guide(args.old), read_guide(args.new)
+    changes = 0
+    for path, status, delta in old.diff(new):
+        changes += 1
+        if args.json:
+            print(json.dumps({"path": path, "status": status, "delta": delta}))
+        else:
+            print(f"{status:<8} {path} {json.dumps(delta)}")
+    #Exit status 1 if data guides differ, like diff
+    return 1 if args.exit_code and changes else 0
+
+#Queries, each a function of (data guide, path, n) returning a value that can be written as JSON
+QUERIES = {
+    "search": lambda guide, path, n: guide.search(path),
+    "card": lambda guide, path, n: guide.card(path),
+    "presence": lambda guide, path, n: guide.presence(path),
+    "core": lambda guide, path, n: guide.core().to_dict(),
+    "paths": lambda guide, path, n: [p for p, _ in guide.iter_paths(path)],
+    "top": lambda guide, path, n: guide.top_values(path, n),
+    "distinct": lambda guide, path, n: guide.distinct(path),
+    "value_stats": lambda guide, path, n: guide.value_stats(path),
+    "memory": lambda guide, path, n: guide.memory_usage(path),
+    "memory_report": lambda guide, path, n: guide.memory_report(n or 10),
+    "stats": lambda guide, path, n: guide.stats(),
+}
+
+#Queries that need a path
+PATH_QUERIES = {"search", "presence", "top", "distinct", "value_stats"}
+
+def query(args):
+    if args.query in PATH_QUERIES and args.path is None:
+        raise ValueError(f"query {args.query} needs a path")
+    guide = read_guide(args.guide)
+    print(json.dumps(QUERIES[args.query](guide, args.path, args.n), indent=4, default=str))
+    return 0
+
+def export(args):
+    guide = read_guide(args.guide)
+    #Saved data guide, for example to compress or decompress one
+    if args.format == "json":
+        write_guide(guide, args.output)
+        return 0
+    with open_file(args.output, "w") as f:
+        if args.format == "table":
+            guide.export_table(f, delimiter=args.delimiter)
+        elif args.format == "schema":
+            guide.export_json_schema(f)
+        else:
+            guide.print_guide(f)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m dataguide", description="Build, merge, compare and query data guides")
+    commands = parser.add_subparsers(dest="command", required=True)
+    #ingest
+    p = commands.add_parser("ingest", help="build a data guide from documents")
+    p.add_argument("inputs", nargs="+", help="NDJSON/JSON files (optionally .gz/.bz2/.xz), directories or - for stdin")
+    p.add_argument("-o", "--output", required=True, help="saved data guide to write (.gz/.bz2/.xz to compress)")
+    p.add_argument("--workers", type=int, default=1, help="worker processes (default 1, in process)")
+    p.add_argument("--chunk-size", type=int, default=5000, help="NDJSON lines per work item")
+    p.add_argument("--base", help="saved data guide to add the documents to")
+    p.add_argument("--skip-errors", action="store_true", help="skip invalid NDJSON lines instead of stopping")
+    p.add_argument("--value-stats", action="store_true", help="gather value statistics")
+    p.add_argument("--distinct", action="store_true", help="gather distinct value sketches")
+    p.add_argument("--top-k", type=int, help="track the top K values of each path")
+    p.add_argument("--projection", action="append", help="only insert paths matching pattern (repeatable)")
+    p.add_argument("-q", "--quiet", action="store_true", help="do not show progress")
+    p.set_defaults(func=ingest)
+    #merge
+    p = commands.add_parser("merge", help="union saved data guides")
+    p.add_argument("guides", nargs="+", help="saved data guides or directories of them")
+    p.add_argument("-o", "--output", required=True, help="saved data guide to write")
+    p.add_argument("-q", "--quiet", action="store_true", help="do not show progress")
+    p.set_defaults(func=merge)
+    #diff
+    p = commands.add_parser("diff", help="list paths added, removed, retyped or changed between two saved data guides")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--json", action="store_true", help="write one JSON object per change")
+    p.add_argument("--exit-code", action="store_true", help="exit with status 1 if the data guides differ")
+    p.set_defaults(func=diff)
+    #query
+    p = commands.add_parser("query", help="query a saved data guide, result is written as JSON")
+    p.add_argument("guide")
+    p.add_argument("query", choices=list(QUERIES))
+    p.add_argument("path", nargs="?", help="path to query (root or whole data guide if not input)")
+    p.add_argument("-n", type=int, help="number of values (top) or paths (memory_report)")
+    p.set_defaults(func=query)
+    #export
+    p = commands.add_parser("export", help="write a saved data guide in another format")
+    p.add_argument("guide")
+    p.add_argument("-f", "--format", choices=["json", "table", "schema", "text"], default="table")
+    p.add_argument("-o", "--output", default="-", help="file to write (default stdout)")
+    p.add_argument("--delimiter", default="\t", help="table column delimiter")
+    p.set_defaults(func=export)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args) or 0
+    #Output piped into a command that stopped reading (head), stop quietly
+    except BrokenPipeError:
+        sys.stdout = open(os.devnull, "w")
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"dataguide {args.command}: error: {e}", file=sys.stderr)
+        return 1